@@ -0,0 +1,321 @@
+"""
+Offline benchmarks for pubmedpy's XML parsing and extraction hot paths.
+
+Large EFetch, ESummary, and PMC frontmatter (JATS) corpora are synthesized by
+repeating the records in `pubmedpy/tests/data` with unique identifiers, in a
+separate process from the stages. Each stage then runs in a fresh process,
+reporting records per second and the peak resident set size of that process.
+The iter_extract_elems stages compare parser backends: lxml's XMLPullParser,
+as used by pubmedpy, the iterparse approach it replaced, and XMLPullParser on
+XML pruned of unneeded elements. Run from the repository root:
+
+```
+python benchmarks/benchmark.py --n-records 50000 --output benchmark.tsv
+```
+
+Compare the TSV output across commits to catch performance regressions.
+"""
+
+import argparse
+import concurrent.futures
+import copy
+import multiprocessing
+import pathlib
+import sys
+import tempfile
+import time
+import zipfile
+
+import pandas
+from lxml import etree
+
+directory = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(directory.parent))
+
+from pubmedpy import efetch, esummary, pmc_oai  # noqa: E402
+from pubmedpy.xml import (  # noqa: E402
+    iter_extract_elems,
+    parallel_extract_elems,
+    yield_etrees_from_zip,
+)
+
+data_dir = directory.parent.joinpath("pubmedpy", "tests", "data")
+
+
+def synthesize_efetch(path: pathlib.Path, n_records: int) -> None:
+    """
+    Write an EFetch PubmedArticleSet of n_records articles to path.
+    """
+    templates = list(
+        map(copy.deepcopy, iter_extract_elems(data_dir / "efetch.xml", "PubmedArticle"))
+    )
+    with path.open("w", encoding="utf-8") as write_file:
+        write_file.write("<PubmedArticleSet>\n")
+        for i in range(n_records):
+            article = templates[i % len(templates)]
+            pmid = str(10_000_000 + i)
+            article.find("MedlineCitation/PMID").text = pmid
+            article.find(
+                "PubmedData/ArticleIdList/ArticleId[@IdType='pubmed']"
+            ).text = pmid
+            xml_str = etree.tostring(article, encoding="unicode")
+            write_file.write(xml_str.rstrip() + "\n")
+        write_file.write("</PubmedArticleSet>\n")
+
+
+def synthesize_esummary(path: pathlib.Path, n_records: int) -> None:
+    """
+    Write an eSummaryResult of n_records DocSums to path.
+    """
+    templates = list(
+        map(copy.deepcopy, iter_extract_elems(data_dir / "esummary.xml", "DocSum"))
+    )
+    with path.open("w", encoding="utf-8") as write_file:
+        write_file.write("<eSummaryResult>\n")
+        for i in range(n_records):
+            docsum = templates[i % len(templates)]
+            docsum.find("Id").text = str(10_000_000 + i)
+            xml_str = etree.tostring(docsum, encoding="unicode")
+            write_file.write(xml_str.rstrip() + "\n")
+        write_file.write("</eSummaryResult>\n")
+
+
+def synthesize_frontmatter(path: pathlib.Path, n_records: int) -> None:
+    """
+    Write a zip archive of n_records frontmatter articles to path,
+    formatted like the output of `pmc_oai.download_frontmatter_set`.
+    """
+    templates = [
+        etree.parse(str(x)).getroot()
+        for x in sorted(data_dir.joinpath("pmc-frontmatter").glob("*.xml"))
+    ]
+    xpath = "{*}front/{*}article-meta/{*}article-id[@pub-id-type='pmcid']"
+    with zipfile.ZipFile(path, mode="w", compression=zipfile.ZIP_LZMA) as zip_file:
+        for i in range(n_records):
+            article = templates[i % len(templates)]
+            pmcid = f"PMC{10_000_000 + i}"
+            article.find(xpath).text = pmcid
+            xml_str = etree.tostring(article, encoding="unicode")
+            zip_file.writestr(f"{pmcid}.xml", data=xml_str)
+
+
+def synthesize_corpora(corpus: dict, n_records: int) -> float:
+    """
+    Write the corpora to the paths in corpus, returning the seconds taken.
+    """
+    start = time.perf_counter()
+    synthesize_efetch(corpus["efetch"], n_records)
+    synthesize_esummary(corpus["esummary"], n_records)
+    synthesize_frontmatter(corpus["frontmatter"], n_records)
+    return time.perf_counter() - start
+
+
+def stage_iter_extract_elems(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    n = sum(1 for _ in iter_extract_elems(corpus["efetch"], "PubmedArticle"))
+    return n, time.perf_counter() - start
+
+
+def stage_iter_extract_elems_iterparse(corpus: dict, n_jobs: int) -> tuple:
+    """
+    Extract elements with lxml.etree.iterparse, clearing each element and
+    deleting its preceding siblings, as iter_extract_elems did before it
+    switched to XMLPullParser.
+    """
+    start = time.perf_counter()
+    n = 0
+    with open(corpus["efetch"], "rb") as read_file:
+        for _, elem in etree.iterparse(read_file, tag="PubmedArticle"):
+            n += 1
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    return n, time.perf_counter() - start
+
+
+def stage_iter_extract_elems_pruned(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    prune_tags = efetch.get_prune_tags(["pmid", "doi", "publication_date"])
+    elems = iter_extract_elems(corpus["efetch"], "PubmedArticle", prune_tags)
+    n = sum(1 for _ in elems)
+    return n, time.perf_counter() - start
+
+
+def stage_efetch_extract_all(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    elems = iter_extract_elems(corpus["efetch"], "PubmedArticle")
+    n = sum(1 for _ in map(efetch.extract_all, elems))
+    return n, time.perf_counter() - start
+
+
+def stage_efetch_extract_all_parallel(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    results = parallel_extract_elems(
+        corpus["efetch"], "PubmedArticle", efetch.extract_all, n_jobs=n_jobs
+    )
+    n = sum(1 for _ in results)
+    return n, time.perf_counter() - start
+
+
+def stage_efetch_iter_extract_all_fields(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    fields = ["pmid", "doi", "publication_date"]
+    n = sum(1 for _ in efetch.iter_extract_all(corpus["efetch"], fields))
+    return n, time.perf_counter() - start
+
+
+def stage_esummary_parse_esummary(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    elems = iter_extract_elems(corpus["esummary"], "DocSum")
+    n = sum(1 for _ in map(esummary.parse_esummary, elems))
+    return n, time.perf_counter() - start
+
+
+def stage_esummary_parse_esummary_parallel(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    articles = esummary.extract_articles_from_esummaries(
+        corpus["esummary"], n_jobs=n_jobs
+    )
+    return len(articles), time.perf_counter() - start
+
+
+def stage_articles_to_dataframe(corpus: dict, n_jobs: int) -> tuple:
+    articles = esummary.extract_articles_from_esummaries(corpus["esummary"])
+    start = time.perf_counter()
+    article_df = esummary.articles_to_dataframe(articles)
+    return len(article_df), time.perf_counter() - start
+
+
+def stage_extract_dataframe_from_esummaries(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    article_df = esummary.extract_dataframe_from_esummaries(corpus["esummary"])
+    return len(article_df), time.perf_counter() - start
+
+
+def stage_extract_authors_from_article(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    n = 0
+    for name, tree in yield_etrees_from_zip(corpus["frontmatter"]):
+        pmc_oai.extract_authors_from_article(tree.getroot())
+        n += 1
+    return n, time.perf_counter() - start
+
+
+def stage_extract_authors_from_archives_parallel(corpus: dict, n_jobs: int) -> tuple:
+    start = time.perf_counter()
+    author_df = pmc_oai.extract_authors_from_archives(
+        [corpus["frontmatter"]], n_jobs=n_jobs
+    )
+    return author_df.pmcid.nunique(), time.perf_counter() - start
+
+
+stages = {
+    "iter_extract_elems": stage_iter_extract_elems,
+    "iter_extract_elems:iterparse": stage_iter_extract_elems_iterparse,
+    "iter_extract_elems:pruned": stage_iter_extract_elems_pruned,
+    "efetch.extract_all": stage_efetch_extract_all,
+    "efetch.extract_all:parallel": stage_efetch_extract_all_parallel,
+    "efetch.iter_extract_all:fields": stage_efetch_iter_extract_all_fields,
+    "esummary.parse_esummary": stage_esummary_parse_esummary,
+    "esummary.parse_esummary:parallel": stage_esummary_parse_esummary_parallel,
+    "esummary.articles_to_dataframe": stage_articles_to_dataframe,
+    "esummary.extract_dataframe_from_esummaries": stage_extract_dataframe_from_esummaries,
+    "pmc_oai.extract_authors_from_article": stage_extract_authors_from_article,
+    "pmc_oai.extract_authors_from_archives:parallel": stage_extract_authors_from_archives_parallel,
+}
+
+
+def get_peak_rss_mb():
+    """
+    Return the peak resident set size of the current process in megabytes. On
+    Linux, this is VmHWM from /proc/self/status, which resets when a process
+    execs, whereas ru_maxrss carries over the peak of the parent process.
+    Elsewhere, return ru_maxrss, or None where the resource module is
+    unavailable (Windows).
+    """
+    status_path = pathlib.Path("/proc/self/status")
+    if status_path.exists():
+        for line in status_path.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                # reported in kilobytes
+                return round(int(line.split()[1]) / 2**10, 1)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    peak_mb = peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    return round(peak_mb, 1)
+
+
+def run_stage(name: str, corpus: dict, n_jobs: int) -> dict:
+    """
+    Run a stage, returning its records/sec and the peak RSS of the process.
+    Intended to run in a fresh process, such that peak RSS reflects the stage.
+    For parallel stages, peak RSS excludes the worker processes.
+    """
+    n_records, seconds = stages[name](corpus, n_jobs)
+    return {
+        "stage": name,
+        "records": n_records,
+        "seconds": round(seconds, 3),
+        "records_per_second": round(n_records / seconds, 1),
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+
+
+def parse_arguments(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--n-records", type=int, default=20_000, help="records per corpus"
+    )
+    parser.add_argument(
+        "--n-jobs", type=int, default=None, help="processes for parallel stages"
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=list(stages),
+        default=list(stages),
+        help="stages to benchmark (default: all)",
+    )
+    parser.add_argument(
+        "--workdir", type=pathlib.Path, help="directory to write corpora to"
+    )
+    parser.add_argument("--output", type=pathlib.Path, help="path to write a TSV")
+    return parser.parse_args(args)
+
+
+def main(args=None) -> pandas.DataFrame:
+    args = parse_arguments(args)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        workdir = args.workdir or pathlib.Path(temp_dir)
+        workdir.mkdir(parents=True, exist_ok=True)
+        corpus = {
+            "efetch": workdir / "efetch.xml",
+            "esummary": workdir / "esummary.xml",
+            "frontmatter": workdir / "pmc-frontmatter.zip",
+        }
+        # synthesize corpora in another process to keep this process lean
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+            seconds = pool.submit(synthesize_corpora, corpus, args.n_records).result()
+        print(f"synthesized corpora of {args.n_records} records in {seconds:.1f}s")
+
+        rows = list()
+        for name in args.stages:
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+                row = pool.submit(run_stage, name, corpus, args.n_jobs).result()
+            print(f"{name}: {row['records_per_second']} records/s")
+            rows.append(row)
+
+    benchmark_df = pandas.DataFrame(rows)
+    print(benchmark_df.to_string(index=False))
+    if args.output:
+        benchmark_df.to_csv(args.output, sep="\t", index=False)
+    return benchmark_df
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Compact in-memory storage of authors extracted from PubMed and PMC XML, for
+tables with millions of authors where a dictionary per author, each with its
+own list of affiliation strings, would use most of the memory.
+"""
+
+import array
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+import numpy
+import pandas
+
+
+class AuthorTable:
+    """
+    Authors stored as one list of values per column rather than one dictionary
+    per author. Each distinct affiliation string is stored once in
+    `affiliations`, and authors reference their affiliations by integer ids
+    (positions in `affiliations`). The "affiliations" column, if in columns,
+    holds these references. Rows convert back to the author dictionaries of
+    `efetch.extract_authors` and `pmc_oai.extract_authors_from_article` with
+    `to_records`, or to a dataframe with `to_dataframe`.
+    """
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = tuple(columns)
+        self._values = {
+            column: list() for column in self.columns if column != "affiliations"
+        }
+        self.affiliations: List[str] = list()
+        self._affiliation_to_id: Dict[str, int] = dict()
+        # affiliation ids of author i are ids[offsets[i] : offsets[i + 1]]
+        self._offsets = array.array("q", [0])
+        self._ids = array.array("q")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getstate__(self):
+        # the affiliation to id mapping is rebuilt from affiliations on unpickling
+        state = self.__dict__.copy()
+        del state["_affiliation_to_id"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._affiliation_to_id = {
+            affiliation: i for i, affiliation in enumerate(self.affiliations)
+        }
+
+    def get_affiliation_id(self, affiliation: str) -> int:
+        """
+        Return the id of affiliation, adding it to the affiliation table if new.
+        """
+        affiliation_id = self._affiliation_to_id.get(affiliation)
+        if affiliation_id is None:
+            affiliation_id = len(self.affiliations)
+            self.affiliations.append(affiliation)
+            self._affiliation_to_id[affiliation] = affiliation_id
+        return affiliation_id
+
+    def append(self, author: dict) -> None:
+        """
+        Add an author dictionary, where missing keys have None values.
+        """
+        for column, values in self._values.items():
+            values.append(author.get(column))
+        for affiliation in author.get("affiliations") or ():
+            self._ids.append(self.get_affiliation_id(affiliation))
+        self._offsets.append(len(self._ids))
+
+    def extend(self, authors: Iterable[dict]) -> None:
+        for author in authors:
+            self.append(author)
+
+    def extend_table(self, table: "AuthorTable") -> None:
+        """
+        Add the authors of another table with the same columns, such as a table
+        extracted in another process.
+        """
+        if table.columns != self.columns:
+            raise ValueError(f"columns differ: {table.columns} != {self.columns}")
+        for column, values in self._values.items():
+            values.extend(table._values[column])
+        id_map = [
+            self.get_affiliation_id(affiliation) for affiliation in table.affiliations
+        ]
+        self._ids.extend(id_map[affiliation_id] for affiliation_id in table._ids)
+        offset = self._offsets[-1]
+        self._offsets.extend(offset + x for x in table._offsets[1:])
+
+    def get_affiliation_ids(self, i: int) -> List[int]:
+        """
+        Return the affiliation ids of the author at position i.
+        """
+        return self._ids[self._offsets[i] : self._offsets[i + 1]].tolist()
+
+    def __getitem__(self, i: int) -> dict:
+        if not -len(self) <= i < len(self):
+            raise IndexError("author index out of range")
+        i %= len(self)
+        author = dict()
+        for column in self.columns:
+            if column == "affiliations":
+                author[column] = [
+                    self.affiliations[affiliation_id]
+                    for affiliation_id in self.get_affiliation_ids(i)
+                ]
+            else:
+                author[column] = self._values[column][i]
+        return author
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_records(self) -> List[dict]:
+        """
+        Return a list with a dictionary per author.
+        """
+        return list(self)
+
+    def to_dataframe(self) -> pandas.DataFrame:
+        """
+        Return a dataframe with a row per author and a column for each of
+        columns. The "affiliations" column contains lists of affiliations, which
+        share the string objects of the affiliation table.
+        """
+        data = dict()
+        for column in self.columns:
+            if column == "affiliations":
+                data[column] = [
+                    [self.affiliations[affiliation_id] for affiliation_id in ids]
+                    for ids in self._iter_affiliation_ids()
+                ]
+            else:
+                data[column] = self._values[column]
+        return pandas.DataFrame(data, columns=list(self.columns))
+
+    def _iter_affiliation_ids(self) -> Iterator[array.array]:
+        ids, offsets = self._ids, self._offsets
+        for i in range(len(self)):
+            yield ids[offsets[i] : offsets[i + 1]]
+
+    def affiliation_pairs(self) -> pandas.DataFrame:
+        """
+        Return a dataframe with a row for each author affiliation, with columns
+        for the position of the author in the table (author_index) and the
+        position of the affiliation in `affiliations` (affiliation_id).
+        """
+        counts = numpy.diff(numpy.frombuffer(self._offsets, dtype=numpy.int64))
+        return pandas.DataFrame(
+            {
+                "author_index": numpy.repeat(numpy.arange(len(self)), counts),
+                "affiliation_id": numpy.array(self._ids, dtype=numpy.int64),
+            }
+        )
@@ -0,0 +1,239 @@
+"""
+Build a local store of PubMed records from the annual baseline and the daily
+update files distributed at <https://ftp.ncbi.nlm.nih.gov/pubmed/>, as an
+alternative to downloading records with the E-utilities.
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import mimetypes
+import os
+import pathlib
+import sqlite3
+import time
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+from .utils import PathType
+from .xml import _CompressedXMLWriter, iter_extract_elems
+
+_record_tags = ("PubmedArticle", "PubmedBookArticle", "DeleteCitation")
+
+
+def _get_record_pmid(elem: etree._Element) -> Tuple[int, int]:
+    """
+    Return the PMID and version of a <PubmedArticle> or <PubmedBookArticle>.
+    """
+    path = (
+        "MedlineCitation/PMID" if elem.tag == "PubmedArticle" else "BookDocument/PMID"
+    )
+    pmid_elem = elem.find(path)
+    return int(pmid_elem.text), int(pmid_elem.get("Version", "1"))
+
+
+def _parse_pubmed_file(path: str) -> List[tuple]:
+    """
+    Return the changes of a baseline or update file in document order, as
+    ("upsert", pmid, version, compressed_xml) tuples for records and
+    ("delete", pmid) tuples for the PMIDs of <DeleteCitation> elements.
+    """
+    changes = list()
+    for elem in iter_extract_elems(path, tag=_record_tags):
+        if elem.tag == "DeleteCitation":
+            changes.extend(("delete", int(pmid.text)) for pmid in elem.iter("PMID"))
+            continue
+        pmid, version = _get_record_pmid(elem)
+        xml = etree.tostring(elem, encoding="utf-8", with_tail=False)
+        changes.append(("upsert", pmid, version, zlib.compress(xml, 1)))
+    return changes
+
+
+def list_pubmed_files(paths: Iterable[PathType]) -> List[str]:
+    """
+    Return the XML files in paths, which can be files or directories such as
+    local copies of the baseline and updatefiles directories, sorted by file
+    name. Update files are numbered after the baseline files, such that sorting
+    by name orders files by release.
+    """
+    files = list()
+    for path in map(pathlib.Path, paths):
+        if path.is_dir():
+            files.extend(path.glob("*.xml"))
+            files.extend(path.glob("*.xml.gz"))
+        else:
+            files.append(path)
+    files.sort(key=lambda path: path.name)
+    return list(map(str, files))
+
+
+class PubmedStore:
+    """
+    SQLite store with the latest version of each PubMed record, built by
+    applying baseline and update files in order with `ingest`. Records are
+    stored as zlib-compressed <PubmedArticle> or <PubmedBookArticle> XML, keyed
+    by PMID. For each PMID, the record with the highest version is kept, with
+    later files replacing earlier files for the same version. <DeleteCitation>
+    elements delete records. Ingested files are recorded, such that ingesting a
+    directory again only applies new update files. Use a new store for each
+    annual baseline.
+    """
+
+    def __init__(self, path: PathType):
+        self.connection = sqlite3.connect(str(path))
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    pmid INTEGER PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    file TEXT NOT NULL,
+                    xml BLOB NOT NULL
+                )
+                """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    name TEXT PRIMARY KEY,
+                    n_upserted INTEGER NOT NULL,
+                    n_deleted INTEGER NOT NULL,
+                    ingested_at REAL NOT NULL
+                )
+                """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM records").fetchone()
+        return count
+
+    def get_ingested_files(self) -> List[str]:
+        """
+        Return the names of ingested files in the order they were applied.
+        """
+        rows = self.connection.execute("SELECT name FROM files ORDER BY name")
+        return [name for (name,) in rows]
+
+    def get(self, pmid) -> Optional[str]:
+        """
+        Return the XML of the record for pmid, or None if it is not stored.
+        """
+        row = self.connection.execute(
+            "SELECT xml FROM records WHERE pmid = ?", [int(pmid)]
+        ).fetchone()
+        return None if row is None else zlib.decompress(row[0]).decode("utf-8")
+
+    def iter_records(self) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (pmid, xml) for all records in order of PMID.
+        """
+        rows = self.connection.execute("SELECT pmid, xml FROM records ORDER BY pmid")
+        for pmid, xml in rows:
+            yield pmid, zlib.decompress(xml).decode("utf-8")
+
+    def write_xml(self, path: PathType) -> None:
+        """
+        Write all records to a PubmedArticleSet XML file, which is compressed
+        according to its extension, for extraction with `efetch.iter_extract_all`.
+        """
+        path = os.fspath(path)
+        _, encoding = mimetypes.guess_type(path)
+        if encoding is not None:
+            writer = _CompressedXMLWriter(path, "PubmedArticleSet")
+            try:
+                for _, xml in self.iter_records():
+                    writer.write(xml)
+            finally:
+                writer.close()
+            return
+        with open(path, "wt", encoding="utf-8") as write_file:
+            write_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            write_file.write("<PubmedArticleSet>\n")
+            for _, xml in self.iter_records():
+                write_file.write(xml + "\n")
+            write_file.write("</PubmedArticleSet>\n")
+
+    def _apply_changes(self, name: str, changes: List[tuple]) -> None:
+        """
+        Apply the changes of a file in one transaction, and record the file.
+        """
+        counter = collections.Counter(change[0] for change in changes)
+        with self.connection:
+            for action, group in itertools.groupby(changes, key=lambda x: x[0]):
+                if action == "delete":
+                    self.connection.executemany(
+                        "DELETE FROM records WHERE pmid = ?",
+                        [(pmid,) for _, pmid in group],
+                    )
+                    continue
+                # replace a record unless a higher version is stored
+                self.connection.executemany(
+                    """
+                    INSERT OR REPLACE INTO records
+                    SELECT ?, ?, ?, ?
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM records WHERE pmid = ? AND version > ?
+                    )
+                    """,
+                    [
+                        (pmid, version, name, xml, pmid, version)
+                        for _, pmid, version, xml in group
+                    ],
+                )
+            self.connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?)",
+                [name, counter["upsert"], counter["delete"], time.time()],
+            )
+
+    def ingest(
+        self, paths: Iterable[PathType], n_jobs: Optional[int] = None, tqdm=None
+    ) -> List[str]:
+        """
+        Apply the baseline and update files in paths (see `list_pubmed_files`)
+        that have not been ingested, in order of file name. Files are
+        decompressed and parsed in a pool of `n_jobs` processes (defaults to the
+        number of CPUs), while changes are applied in order by this process.
+        Each file is applied in a single transaction, such that an interrupted
+        ingest resumes from the first file that was not applied. Returns the
+        names of the applied files.
+        """
+        ingested = set(self.get_ingested_files())
+        files = [
+            path
+            for path in list_pubmed_files(paths)
+            if os.path.basename(path) not in ingested
+        ]
+        if files and ingested and os.path.basename(files[0]) < max(ingested):
+            raise ValueError(
+                f"{files[0]} precedes the last ingested file {max(ingested)}"
+            )
+        progress_bar = tqdm(total=len(files), unit="files") if tqdm else None
+        applied = list()
+        # bound the number of parsed files held in memory
+        n_pending = 2 * (n_jobs or os.cpu_count() or 1)
+        files = iter(files)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            pending = collections.deque(
+                (path, executor.submit(_parse_pubmed_file, path))
+                for path in itertools.islice(files, n_pending)
+            )
+            while pending:
+                path, future = pending.popleft()
+                name = os.path.basename(path)
+                self._apply_changes(name, future.result())
+                applied.append(name)
+                path = next(files, None)
+                if path is not None:
+                    pending.append((path, executor.submit(_parse_pubmed_file, path)))
+                if progress_bar is not None:
+                    progress_bar.update(1)
+        if progress_bar is not None:
+            progress_bar.close()
+        return applied
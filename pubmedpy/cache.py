@@ -0,0 +1,137 @@
+"""
+Persistent local storage of PubMed records fetched from the E-utilities, such
+that repeated downloads of overlapping identifiers only request records that
+are missing or stale.
+"""
+
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from .utils import PathType
+
+
+class RecordCache:
+    """
+    SQLite store of the XML for PubMed records, keyed by E-utility endpoint (such
+    as "esummary" or "efetch") and PMID, with the time each record was fetched.
+    Records fetched more than `ttl` seconds ago are stale, and treated as missing
+    by `get_many`. Set `ttl=None` for records to never become stale. XML is
+    stored zlib-compressed. Methods are safe to call from multiple threads.
+
+    Pass a cache as the `cache` argument of `eutilities.download_pubmed_ids` to
+    only fetch records missing from the cache.
+    """
+
+    def __init__(self, path: PathType, ttl: Optional[float] = 30 * 24 * 60 * 60):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    endpoint TEXT NOT NULL,
+                    pmid TEXT NOT NULL,
+                    xml BLOB NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (endpoint, pmid)
+                )
+                """)
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS records_fetched_at ON records (fetched_at)"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+    def __len__(self) -> int:
+        with self.lock:
+            (count,) = self.connection.execute(
+                "SELECT COUNT(*) FROM records"
+            ).fetchone()
+        return count
+
+    def _get_cutoff(self, max_age: Optional[float]) -> float:
+        """
+        Return the fetch time before which records are older than max_age seconds.
+        """
+        return float("-inf") if max_age is None else time.time() - max_age
+
+    def get_many(self, endpoint: str, pmids: Iterable) -> Dict[str, str]:
+        """
+        Return a dictionary of PMID to XML for the pmids with fresh records.
+        """
+        pmids = list(map(str, pmids))
+        cutoff = self._get_cutoff(self.ttl)
+        pmid_to_xml = dict()
+        with self.lock:
+            # stay below SQLite's limit on the number of query parameters
+            for i in range(0, len(pmids), 500):
+                subset = pmids[i : i + 500]
+                rows = self.connection.execute(
+                    f"""
+                    SELECT pmid, xml FROM records
+                    WHERE endpoint = ? AND fetched_at >= ?
+                    AND pmid IN ({",".join("?" * len(subset))})
+                    """,
+                    [endpoint, cutoff, *subset],
+                )
+                for pmid, xml in rows:
+                    pmid_to_xml[pmid] = zlib.decompress(xml).decode("utf-8")
+        return pmid_to_xml
+
+    def put_many(
+        self,
+        endpoint: str,
+        records: Iterable[Tuple[str, str]],
+        fetched_at: Optional[float] = None,
+    ) -> None:
+        """
+        Store `(pmid, xml)` records, replacing existing records for the PMIDs.
+        """
+        if fetched_at is None:
+            fetched_at = time.time()
+        rows = [
+            (endpoint, str(pmid), zlib.compress(xml.encode("utf-8"), 1), fetched_at)
+            for pmid, xml in records
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)", rows
+            )
+
+    def evict(
+        self, max_age: Optional[float] = None, max_records: Optional[int] = None
+    ) -> int:
+        """
+        Delete records fetched more than max_age seconds ago (defaults to ttl) and,
+        when max_records is specified, the least recently fetched records beyond
+        max_records. Returns the number of records deleted.
+        """
+        if max_age is None:
+            max_age = self.ttl
+        with self.lock, self.connection:
+            n_deleted = self.connection.execute(
+                "DELETE FROM records WHERE fetched_at < ?",
+                [self._get_cutoff(max_age)],
+            ).rowcount
+            if max_records is not None:
+                n_deleted += self.connection.execute(
+                    """
+                    DELETE FROM records WHERE rowid IN (
+                        SELECT rowid FROM records
+                        ORDER BY fetched_at DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    [max_records],
+                ).rowcount
+        return n_deleted
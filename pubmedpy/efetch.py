@@ -3,37 +3,194 @@ import typing
 
 import lxml.etree
 
+from .authors import AuthorTable
+from .utils import PathType
+from .xml import iter_extract_elems
 
-def extract_all(elem: lxml.etree._Element) -> dict:
+# XPath expressions for <PubmedArticle> elements, compiled once at import
+_xpath_article = lxml.etree.XPath("MedlineCitation/Article")
+_xpath_journal_info = lxml.etree.XPath("MedlineCitation/MedlineJournalInfo")
+_xpath_article_ids = lxml.etree.XPath("PubmedData/ArticleIdList/ArticleId")
+_xpath_title = lxml.etree.XPath("ArticleTitle")
+_xpath_article_dates = lxml.etree.XPath("ArticleDate")
+_xpath_pubdate = lxml.etree.XPath("Journal/JournalIssue/PubDate")
+_xpath_authors = lxml.etree.XPath("AuthorList/Author")
+
+
+def _first(nodes: list) -> typing.Optional[lxml.etree._Element]:
+    """
+    Return the first node from the result of a compiled XPath or None.
+    """
+    return nodes[0] if nodes else None
+
+
+def _first_text(
+    xpath: lxml.etree.XPath, elem: typing.Optional[lxml.etree._Element]
+) -> typing.Optional[str]:
     """
-    Extract a dictionary of all supported fields from a <PubmedArticle> XML element
+    Return the text of the first node matched by a compiled XPath relative to
+    elem, with the same semantics as `elem.findtext(path)`.
     """
+    if elem is None:
+        return None
+    node = _first(xpath(elem))
+    if node is None:
+        return None
+    return node.text or ""
+
+
+def _child_texts(elem: typing.Optional[lxml.etree._Element], tags: tuple) -> dict:
+    """
+    Return a dictionary of tag to text for the first child of elem with each of
+    the specified tags. Equivalent to `elem.findtext(tag)` for each tag, but
+    traverses the children once. Missing tags are omitted.
+    """
+    texts = dict()
+    if elem is None:
+        return texts
+    for child in elem:
+        if child.tag in tags and child.tag not in texts:
+            texts[child.tag] = child.text or ""
+    return texts
+
+
+# fields of extract_all and the <PubmedArticle> descendants each field reads
+_field_to_tags = collections.OrderedDict(
+    [
+        ("pmid", ("ArticleIdList",)),
+        ("pmcid", ("ArticleIdList",)),
+        ("doi", ("ArticleIdList",)),
+        ("journal", ("MedlineJournalInfo",)),
+        ("journal_nlm_id", ("MedlineJournalInfo",)),
+        ("title", ("ArticleTitle",)),
+        ("publication_date", ("ArticleDate", "PubDate")),
+        ("authors", ("AuthorList",)),
+    ]
+)
+supported_fields = tuple(_field_to_tags)
+
+# tags of <PubmedArticle> descendants with large subtrees, or that only some
+# fields read, which can be pruned before parsing
+_prunable_tags = frozenset(
+    [
+        "Abstract",
+        "AuthorList",
+        "ChemicalList",
+        "CommentsCorrectionsList",
+        "DataBankList",
+        "GeneSymbolList",
+        "GrantList",
+        "History",
+        "InvestigatorList",
+        "KeywordList",
+        "MeshHeadingList",
+        "OtherAbstract",
+        "PersonalNameSubjectList",
+        "PublicationTypeList",
+        "ReferenceList",
+        "SupplMeshList",
+    ]
+)
+
+
+def _check_fields(fields: typing.Optional[typing.Iterable[str]]) -> tuple:
+    """
+    Return the requested fields in the order of `supported_fields`, or all
+    fields when fields is None.
+    """
+    if fields is None:
+        return supported_fields
+    fields = set(fields)
+    unknown = fields.difference(supported_fields)
+    if unknown:
+        raise ValueError(f"unsupported fields: {sorted(unknown)}")
+    return tuple(field for field in supported_fields if field in fields)
+
+
+def get_prune_tags(
+    fields: typing.Optional[typing.Iterable[str]] = None,
+) -> typing.FrozenSet[str]:
+    """
+    Return the tags of <PubmedArticle> subtrees that `extract_all(elem, fields)`
+    does not read, for the prune_tags argument of `xml.iter_extract_elems`.
+    """
+    tags = set()
+    for field in _check_fields(fields):
+        tags.update(_field_to_tags[field])
+    return _prunable_tags.difference(tags)
+
+
+def extract_all(
+    elem: lxml.etree._Element, fields: typing.Optional[typing.Iterable[str]] = None
+) -> dict:
+    """
+    Extract a dictionary of all supported fields from a <PubmedArticle> XML element,
+    or only the specified fields (see `supported_fields`).
+    """
+    if fields is not None:
+        fields = _check_fields(fields)
+        extracted = _extract_fields(elem, fields)
+        return collections.OrderedDict((field, extracted[field]) for field in fields)
+    return _extract_fields(elem, supported_fields)
+
+
+def _extract_fields(elem: lxml.etree._Element, fields: tuple) -> dict:
+    """
+    Extract a dictionary with the specified fields, and possibly others, from a
+    <PubmedArticle> XML element, skipping the extraction of unrequested fields.
+    """
+    fields = set(fields)
+    article = _first(_xpath_article(elem))
     result = collections.OrderedDict()
-    result.update(extract_identifiers(elem))
-    result["journal"] = elem.findtext("MedlineCitation/MedlineJournalInfo/MedlineTA")
-    result["journal_nlm_id"] = elem.findtext(
-        "MedlineCitation/MedlineJournalInfo/NlmUniqueID"
-    )
-    result["title"] = elem.findtext("MedlineCitation/Article/ArticleTitle")
-    result["publication_date"] = extract_publication_date(elem)
-    result["authors"] = extract_authors(elem)
+    if not fields.isdisjoint(("pmid", "pmcid", "doi")):
+        result.update(extract_identifiers(elem))
+    if not fields.isdisjoint(("journal", "journal_nlm_id")):
+        journal_info = _child_texts(
+            _first(_xpath_journal_info(elem)), ("MedlineTA", "NlmUniqueID")
+        )
+        result["journal"] = journal_info.get("MedlineTA")
+        result["journal_nlm_id"] = journal_info.get("NlmUniqueID")
+    if "title" in fields:
+        result["title"] = _first_text(_xpath_title, article)
+    if "publication_date" in fields:
+        result["publication_date"] = _extract_publication_date(article)
+    if "authors" in fields:
+        result["authors"] = _extract_authors(article)
     return result
 
 
+def iter_extract_all(
+    path: PathType, fields: typing.Optional[typing.Iterable[str]] = None
+) -> typing.Iterator[dict]:
+    """
+    Yield `extract_all(elem, fields)` for each <PubmedArticle> in an XML file,
+    such as the output of `eutilities.download_pubmed_ids(endpoint="efetch")` or
+    a gzipped PubMed baseline file. Subtrees that the requested fields do not
+    read, such as reference lists, abstracts, and MeSH headings, are skipped
+    without being parsed.
+    """
+    fields = _check_fields(fields)
+    prune_tags = get_prune_tags(fields)
+    for elem in iter_extract_elems(path, "PubmedArticle", prune_tags=prune_tags):
+        yield extract_all(elem, fields)
+
+
 def extract_identifiers(elem: lxml.etree._Element) -> dict:
     """
     Exctract a dictionary of identifiers from a <PubmedArticle> XML element
     """
-    identifiers = dict()
     renamer = {
         "pubmed": "pmid",
         "pmc": "pmcid",
         "doi": "doi",
     }
+    # text of the first ArticleId for each IdType
+    id_type_to_text = dict()
+    for id_elem in _xpath_article_ids(elem):
+        id_type_to_text.setdefault(id_elem.get("IdType"), id_elem.text or "")
+    identifiers = dict()
     for id_type, id_type_name in renamer.items():
-        identifiers[id_type_name] = elem.findtext(
-            f"PubmedData/ArticleIdList/ArticleId[@IdType={id_type!r}]"
-        )
+        identifiers[id_type_name] = id_type_to_text.get(id_type)
     if identifiers["doi"]:
         # convert DOIs to all lowercase for standardization
         identifiers["doi"] = identifiers["doi"].lower()
@@ -44,14 +201,22 @@ def extract_publication_date(elem: lxml.etree._Element) -> typing.Optional[str]:
     """
     Select the publication date from a <PubmedArticle> XML element
     """
-    dates = [
-        _date_elem_to_str(x)
-        for x in elem.findall("MedlineCitation/Article/ArticleDate")
-    ]
+    return _extract_publication_date(_first(_xpath_article(elem)))
+
+
+def _extract_publication_date(
+    article: typing.Optional[lxml.etree._Element],
+) -> typing.Optional[str]:
+    """
+    Select the publication date from a <MedlineCitation/Article> XML element
+    """
+    if article is None:
+        return None
+    dates = [_date_elem_to_str(x) for x in _xpath_article_dates(article)]
     if dates:
         return sorted(dates)[0]
     else:
-        pubdate = elem.find("MedlineCitation/Article/Journal/JournalIssue/PubDate")
+        pubdate = _first(_xpath_pubdate(article))
         return _date_elem_to_str(pubdate)
 
 
@@ -77,18 +242,19 @@ def _date_elem_to_str(elem: lxml.etree._Element) -> typing.Optional[str]:
     """
     if elem is None:
         return None
-    year = elem.findtext("Year")
+    texts = _child_texts(elem, ("Year", "Month", "Day"))
+    year = texts.get("Year")
     try:
         year = int(year)
     except (ValueError, TypeError):
         return None
-    month = elem.findtext("Month")
+    month = texts.get("Month")
     month = _month_abbrev_to_int.get(month, month)
     try:
         month = int(month)
     except (ValueError, TypeError):
         return f"{year:04d}"
-    day = elem.findtext("Day")
+    day = texts.get("Day")
     try:
         day = int(day)
     except (ValueError, TypeError):
@@ -100,16 +266,46 @@ def extract_authors(elem: lxml.etree._Element) -> list:
     """
     Exctract a list of authors from a <PubmedArticle> XML element
     """
+    return _extract_authors(_first(_xpath_article(elem)))
+
+
+def extract_authors_table(elems: typing.Iterable[lxml.etree._Element]) -> AuthorTable:
+    """
+    Extract authors from <PubmedArticle> XML elements, such as those yielded by
+    `xml.iter_extract_elems(path, "PubmedArticle")`, into an AuthorTable with
+    the pmid and position of each author and the fields of `extract_authors`.
+    """
+    table = AuthorTable(("pmid", "position", "fore_name", "last_name", "affiliations"))
+    for elem in elems:
+        pmid = extract_identifiers(elem)["pmid"]
+        for i, author in enumerate(extract_authors(elem)):
+            author["pmid"] = pmid
+            author["position"] = i + 1
+            table.append(author)
+    return table
+
+
+def _extract_authors(article: typing.Optional[lxml.etree._Element]) -> list:
+    """
+    Exctract a list of authors from a <MedlineCitation/Article> XML element
+    """
     authors = list()
-    author_elems = elem.findall("MedlineCitation/Article/AuthorList/Author")
-    for author_elem in author_elems:
+    if article is None:
+        return authors
+    for author_elem in _xpath_authors(article):
+        names = _child_texts(author_elem, ("ForeName", "LastName"))
+        affiliations = [
+            affiliation.text
+            for info in author_elem
+            if info.tag == "AffiliationInfo"
+            for affiliation in info
+            if affiliation.tag == "Affiliation"
+        ]
         authors.append(
             {
-                "fore_name": author_elem.findtext("ForeName"),
-                "last_name": author_elem.findtext("LastName"),
-                "affiliations": [
-                    x.text for x in author_elem.findall("AffiliationInfo/Affiliation")
-                ],
+                "fore_name": names.get("ForeName"),
+                "last_name": names.get("LastName"),
+                "affiliations": affiliations,
             }
         )
     return authors
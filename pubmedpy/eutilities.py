@@ -1,48 +1,550 @@
-import time
+import bisect
 import collections
+import collections.abc
+import concurrent.futures
+import functools
+import itertools
 import logging
-from typing import IO
+import os
+from typing import IO, Callable, Iterable, Iterator, Optional
 
 import requests
 import lxml.etree
 import tqdm
 
+from .cache import RecordCache
+from .utils import PathType, RateLimiter
 
-def esearch_query(
-    payload: dict, retmax: int = 10000, sleep: float = 0.34, tqdm=tqdm.tqdm
-):
+
+@functools.lru_cache()
+def get_session() -> requests.Session:
     """
-    Return identifiers using the ESearch E-utility.
+    Return the requests session shared by E-utilities requests. The session pools
+    connections, such that successive requests (including those from concurrent
+    threads) reuse TCP/TLS connections to NCBI. Responses are gzip-compressed,
+    since requests sends `Accept-Encoding: gzip, deflate` by default.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=32)
+    session.mount("https://", adapter)
+    return session
+
+
+@functools.lru_cache()
+def get_rate_limiter(interval: float = 0.34) -> RateLimiter:
+    """
+    Return the rate limiter shared by E-utilities requests in this process that
+    start at most once every interval seconds. Searches and downloads with the
+    same `sleep`, such as `iter_esearch_ids` passed as ids to
+    `download_pubmed_ids`, thereby stay within NCBI's rate limit together.
+    """
+    return RateLimiter(interval=interval)
+
+
+def eutilities_request(
+    utility: str,
+    payload: dict,
+    stream: bool = False,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> requests.Response:
+    """
+    Submit a request to an E-utility such as "esearch", "esummary", or "efetch".
+    Requests use HTTP POST, which unlike GET does not limit payload length,
+    such that a single request can specify thousands of IDs. Set stream to
+    read the response body incrementally with `response.iter_content`. When
+    rate_limiter is specified, wait on it before submitting the request.
+    """
+    if rate_limiter is not None:
+        rate_limiter.wait()
+    url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/{utility}.fcgi"
+    response = get_session().post(url, data=payload, stream=stream)
+    try:
+        response.raise_for_status()
+    except requests.HTTPError:
+        # release the pooled connection of a streamed response
+        response.close()
+        raise
+    return response
+
+
+def _request_esearch_page(
+    payload: dict, rate_limiter: RateLimiter, error_sleep: float
+) -> lxml.etree._Element:
+    """
+    Return the parsed ESearch response for payload. Failed requests are
+    retried after pausing rate_limiter, for error_sleep seconds times the
+    number of successive errors, as for batches in `_iter_fetched_batches`.
+    """
+    successive_errors = 0
+    while True:
+        try:
+            response = eutilities_request("esearch", payload, rate_limiter=rate_limiter)
+            return lxml.etree.fromstring(response.content)
+        except Exception as e:
+            successive_errors += 1
+            logging.warning(
+                f"{successive_errors} successive error: ESearch page at "
+                f"retstart {payload['retstart']} threw {e}"
+            )
+            rate_limiter.pause(error_sleep * successive_errors)
+
+
+def iter_esearch_ids(
+    payload: dict,
+    retmax: int = 10000,
+    sleep: float = 0.34,
+    tqdm=tqdm.tqdm,
+    error_sleep: float = 10,
+) -> Iterator[str]:
+    """
+    Yield identifiers using the ESearch E-utility, one page of `retmax`
+    identifiers at a time. Pages are requested as the generator is consumed, so
+    passing the generator as `ids` to `download_pubmed_ids` overlaps searching
+    with fetching. Requests wait on `get_rate_limiter(sleep)`, which is shared
+    with downloads using the same `sleep`. Failed pages are retried, backing
+    off by `error_sleep` seconds per successive error.
 
     Set `tqdm=tqdm.notebook` to use the tqdm notebook interface.
     Set `tqdm=None` to disable the progress bar.
     """
-    url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-    payload["rettype"] = "xml"
-    payload["retmax"] = retmax
-    payload["retstart"] = 0
-    ids = list()
+    payload = {**payload, "rettype": "xml", "retmax": retmax, "retstart": 0}
+    rate_limiter = get_rate_limiter(sleep)
     count = 1
     progress_bar = None
     while payload["retstart"] < count:
-        response = requests.get(url, params=payload)
-        tree = lxml.etree.fromstring(response.content)
+        tree = _request_esearch_page(payload, rate_limiter, error_sleep)
         count = int(tree.findtext("Count"))
         if tqdm and not progress_bar:
             progress_bar = tqdm(total=count, unit="ids")
         add_ids = [id_.text for id_ in tree.findall("IdList/Id")]
-        ids += add_ids
         payload["retstart"] += retmax
         if tqdm:
             progress_bar.update(len(add_ids))
-        time.sleep(sleep)
+        yield from add_ids
     if tqdm:
         progress_bar.close()
-    return ids
+
+
+def esearch_query(
+    payload: dict,
+    retmax: int = 10000,
+    sleep: float = 0.34,
+    tqdm=tqdm.tqdm,
+    error_sleep: float = 10,
+):
+    """
+    Return identifiers using the ESearch E-utility.
+
+    Set `tqdm=tqdm.notebook` to use the tqdm notebook interface.
+    Set `tqdm=None` to disable the progress bar.
+    """
+    ids = iter_esearch_ids(
+        payload, retmax=retmax, sleep=sleep, tqdm=tqdm, error_sleep=error_sleep
+    )
+    return list(ids)
+
+
+def esearch_history(payload: dict, sleep: float = 0.34) -> dict:
+    """
+    Submit an ESearch query with `usehistory=y`, which stores the matching
+    identifiers on the Entrez history server rather than returning them.
+    Return a dictionary with the `count` of matches as well as the `webenv` and
+    `query_key` that reference the stored result, for use with
+    `download_pubmed_history`. The request waits on `get_rate_limiter(sleep)`.
+    """
+    payload = {**payload, "usehistory": "y", "retmax": 0, "rettype": "xml"}
+    response = eutilities_request(
+        "esearch", payload, rate_limiter=get_rate_limiter(sleep)
+    )
+    tree = lxml.etree.fromstring(response.content)
+    return {
+        "count": int(tree.findtext("Count")),
+        "webenv": tree.findtext("WebEnv"),
+        "query_key": tree.findtext("QueryKey"),
+    }
+
+
+def _pop_batch(
+    idq: collections.deque,
+    keyed_batches: Iterator[tuple],
+    unyielded: list,
+    max_unyielded: int,
+) -> Optional[tuple]:
+    """
+    Return the next `(key, batch)` to fetch, retrying batches in idq first.
+    New batches are taken from keyed_batches while fewer than max_unyielded
+    batches await yielding. Return None if no batch is available.
+    """
+    if idq:
+        return idq.popleft()
+    if len(unyielded) >= max_unyielded:
+        return None
+    item = next(keyed_batches, None)
+    if item is not None:
+        unyielded.append(item[0])
+    return item
+
+
+def _requeue_batch(
+    key: tuple, batch, retmin: int, idq: collections.deque, unyielded: list
+) -> None:
+    """
+    Queue a batch whose fetch failed to be retried next, split in half while
+    it contains at least `2 * retmin` items. The keys of the halves replace
+    the batch key in unyielded.
+    """
+    if len(batch) < retmin * 2:
+        idq.appendleft((key, batch))
+        return
+    mid = len(batch) // 2
+    i = bisect.bisect_left(unyielded, key)
+    unyielded[i : i + 1] = [key + (0,), key + (1,)]
+    idq.appendleft((key + (1,), batch[mid:]))
+    idq.appendleft((key + (0,), batch[:mid]))
+
+
+def _iter_fetched_batches(
+    batches: Iterable,
+    fetch: Callable,
+    n_jobs: int = 1,
+    retmin: int = 20,
+    sleep: float = 0.34,
+    error_sleep: float = 10,
+) -> Iterator[tuple]:
+    """
+    Yield `(batch, fetch(batch))` tuples in the order of `batches`.
+
+    Up to `n_jobs` calls to `fetch` run concurrently on a thread pool, started at
+    most once every `sleep` seconds, as limited by `get_rate_limiter(sleep)`,
+    which ESearch requests with the same sleep share. Batches whose fetch
+    raises an exception are split in half while they contain at least
+    `2 * retmin` items and retried.
+    """
+    rate_limiter = get_rate_limiter(sleep)
+    # batches keyed by tuples that sort in output order
+    keyed_batches = (((i,), batch) for i, batch in enumerate(batches))
+    # queue of (key, batch) to retry
+    idq = collections.deque()
+    # sorted keys of batches that have not been yielded
+    unyielded = list()
+    completed = dict()
+    pending = dict()
+    successive_errors = 0
+
+    def limited_fetch(batch):
+        rate_limiter.wait()
+        return fetch(batch)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        while True:
+            # Submit requests until n_jobs are in flight
+            while len(pending) < n_jobs:
+                item = _pop_batch(idq, keyed_batches, unyielded, 2 * n_jobs)
+                if item is None:
+                    break
+                pending[executor.submit(limited_fetch, item[1])] = item
+            if not pending:
+                break
+
+            # Process finished requests
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                key, batch = pending.pop(future)
+                try:
+                    result = future.result()
+                    successive_errors = 0
+                except Exception as e:
+                    successive_errors += 1
+                    logging.warning(
+                        f"{successive_errors} successive error: {len(batch)} IDs"
+                        f"[{batch[0]} … {batch[-1]}] threw {e}"
+                    )
+                    _requeue_batch(key, batch, retmin, idq, unyielded)
+                    rate_limiter.pause(error_sleep * successive_errors)
+                    continue
+                completed[key] = batch, result
+
+            # Yield finished batches in order
+            while unyielded and unyielded[0] in completed:
+                yield completed.pop(unyielded.pop(0))
+
+
+def _iter_batches(ids: Iterable, size: int) -> Iterator[list]:
+    """
+    Yield successive lists of `size` items from ids, which can be any iterable.
+    """
+    ids = iter(ids)
+    while True:
+        batch = list(itertools.islice(ids, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _parse_response(response: requests.Response, serialize: bool = False):
+    """
+    Parse the XML of a streamed E-utilities response incrementally as chunks of
+    the body arrive, such that the body is never held in memory in full. Return
+    the root element. When serialize is True, instead return
+    `(root_tag, records)`, where records are `(pmid, xml_str)` tuples for the
+    children of the root. Each child is serialized and freed as soon as it is
+    parsed, such that a parsed tree of the whole response is never held in
+    memory either.
+    """
+    parser = lxml.etree.XMLPullParser(events=("start", "end"))
+    root = None
+    depth = 0
+    records = list()
+    with response:
+        for chunk in response.iter_content(chunk_size=2**16):
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == "start":
+                    if root is None:
+                        root = elem
+                    depth += 1
+                    continue
+                depth -= 1
+                if serialize and depth == 1:
+                    xml_str = lxml.etree.tostring(elem, encoding="unicode")
+                    records.append((_get_record_pmid(elem), xml_str.rstrip()))
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del root[0]
+    root = parser.close()
+    if serialize:
+        return root.tag, records
+    return root
+
+
+def _fetch_pubmed_ids(
+    endpoint: str,
+    id_subset: list,
+    serialize: bool = False,
+    api_key: Optional[str] = None,
+):
+    """
+    Perform an E-utilities API request for id_subset and return the parsed XML,
+    as returned by `_parse_response`.
+    """
+    id_string = ",".join(map(str, id_subset))
+    payload = {"db": "pubmed", "id": id_string, "rettype": "xml"}
+    if api_key is not None:
+        payload["api_key"] = api_key
+    response = eutilities_request(endpoint, payload, stream=True)
+    return _parse_response(response, serialize=serialize)
+
+
+# Root tags of E-utilities responses for PubMed records
+_root_tags = {"esummary": "eSummaryResult", "efetch": "PubmedArticleSet"}
+
+# Tags of records in E-utilities responses
+_record_tags = {"DocSum", "PubmedArticle", "PubmedBookArticle"}
+
+
+def _get_record_pmid(elem: lxml.etree._Element) -> Optional[str]:
+    """
+    Return the PMID of a <DocSum>, <PubmedArticle>, or <PubmedBookArticle>.
+    """
+    if elem.tag == "DocSum":
+        return elem.findtext("Id")
+    if elem.tag == "PubmedArticle":
+        return elem.findtext("MedlineCitation/PMID")
+    if elem.tag == "PubmedBookArticle":
+        return elem.findtext("BookDocument/PMID")
+    return None
+
+
+def _fetch_pubmed_ids_cached(
+    endpoint: str,
+    cache: RecordCache,
+    id_subset: list,
+    serialize: bool = False,
+    api_key: Optional[str] = None,
+):
+    """
+    Like `_fetch_pubmed_ids`, but only request records missing from cache, and
+    store fetched records in cache. Records are returned in the order of
+    id_subset, followed by any elements without a PMID, such as errors.
+    """
+    pmid_to_xml = cache.get_many(endpoint, id_subset)
+    missing = [x for x in id_subset if str(x) not in pmid_to_xml]
+    other_records = list()
+    if missing:
+        _, fetched_records = _fetch_pubmed_ids(
+            endpoint, missing, serialize=True, api_key=api_key
+        )
+        fetched = dict()
+        for pmid, xml_str in fetched_records:
+            if pmid is None:
+                other_records.append((pmid, xml_str))
+            else:
+                fetched[pmid] = xml_str
+        cache.put_many(endpoint, fetched.items())
+        pmid_to_xml.update(fetched)
+    records = [(x, pmid_to_xml[x]) for x in map(str, id_subset) if x in pmid_to_xml]
+    records.extend(other_records)
+    if serialize:
+        return _root_tags[endpoint], records
+    tree = lxml.etree.Element(_root_tags[endpoint])
+    for _, xml_str in records:
+        tree.append(lxml.etree.fromstring(xml_str))
+    return tree
+
+
+def _get_ids_fetcher(
+    endpoint: str,
+    cache: Optional[RecordCache],
+    serialize: bool = False,
+    api_key: Optional[str] = None,
+) -> Callable:
+    """
+    Return a function to fetch a batch of PMIDs, using cache when specified.
+    """
+    if cache is None:
+        return functools.partial(
+            _fetch_pubmed_ids, endpoint, serialize=serialize, api_key=api_key
+        )
+    return functools.partial(
+        _fetch_pubmed_ids_cached,
+        endpoint,
+        cache,
+        serialize=serialize,
+        api_key=api_key,
+    )
+
+
+def _write_tree_children(tree: lxml.etree._Element, write_file: IO) -> None:
+    """
+    Write each child of tree to write_file as XML on its own line.
+    """
+    for elem in tree.getchildren():
+        xml_str = lxml.etree.tostring(elem, encoding="unicode")
+        write_file.write(xml_str.rstrip() + "\n")
+
+
+def _write_records(records: list, write_file: IO) -> None:
+    """
+    Write the XML of `(pmid, xml_str)` records to write_file, one per line.
+    """
+    for _, xml_str in records:
+        write_file.write(xml_str + "\n")
+
+
+def _write_serialized_batches(
+    fetched_batches: Iterable[tuple], write_file: IO, n_total: Optional[int], tqdm
+) -> None:
+    """
+    Write `(batch, (root_tag, records))` tuples from `_iter_fetched_batches`
+    with serialized records to write_file as a single XML document.
+    """
+    progress_bar = tqdm(total=n_total, unit="articles")
+    root_tag = None
+    for batch, (tag, records) in fetched_batches:
+        # Write XML to file
+        if root_tag is None:
+            root_tag = tag
+            write_file.write(f"<{root_tag}>\n")
+        _write_records(records, write_file)
+
+        # Report progress
+        progress_bar.update(len(batch))
+
+    progress_bar.close()
+    # Write final line of XML
+    if root_tag is not None:
+        write_file.write(f"</{root_tag}>\n")
+
+
+def _iter_written_records(
+    fetched_batches: Iterable[tuple],
+    write_file: Optional[IO],
+    n_total: Optional[int],
+    tqdm,
+    extract: Optional[Callable] = None,
+) -> Iterator:
+    """
+    Yield the records of `(batch, tree)` tuples from `_iter_fetched_batches`,
+    or `extract(record)` when extract is specified. When write_file is
+    specified, also write each tree's children to write_file as a single XML
+    document.
+    """
+    progress_bar = tqdm(total=n_total, unit="articles") if tqdm else None
+    root_tag = None
+    for batch, tree in fetched_batches:
+        # Write XML to file
+        if write_file is not None:
+            if root_tag is None:
+                root_tag = tree.tag
+                write_file.write(f"<{root_tag}>\n")
+            _write_tree_children(tree, write_file)
+
+        # Yield records, skipping other elements such as errors
+        for elem in tree:
+            if elem.tag not in _record_tags:
+                continue
+            if extract is None:
+                yield elem
+            else:
+                yield extract(elem)
+                # free the record's subtree
+                elem.clear()
+
+        # Report progress
+        if progress_bar is not None:
+            progress_bar.update(len(batch))
+
+    if progress_bar is not None:
+        progress_bar.close()
+    # Write final line of XML
+    if root_tag is not None:
+        write_file.write(f"</{root_tag}>\n")
+
+
+def iter_pubmed_records(
+    ids: Iterable,
+    endpoint: str = "esummary",
+    extract: Optional[Callable] = None,
+    write_file: Optional[IO] = None,
+    retmax: int = 100,
+    retmin: int = 20,
+    sleep: float = 0.34,
+    error_sleep: float = 10,
+    tqdm=tqdm.tqdm,
+    n_jobs: int = 1,
+    cache: Optional[RecordCache] = None,
+    api_key: Optional[str] = None,
+) -> Iterator:
+    """
+    Yield PubMed records as batches of ESummary or EFetch responses arrive, as
+    `<DocSum>` or `<PubmedArticle>` elements, or as `extract(elem)` when extract
+    is a function such as `esummary.parse_esummary` or `efetch.extract_all`.
+    Records are parsed once from each response, rather than being written to a
+    file and reparsed with `xml.iter_extract_elems`. Specify write_file to also
+    write the XML, as `download_pubmed_ids` does. Other arguments are as for
+    `download_pubmed_ids`.
+
+    Set `tqdm=None` to disable the progress bar.
+    """
+    batches = _iter_batches(ids, retmax)
+    fetched_batches = _iter_fetched_batches(
+        batches,
+        fetch=_get_ids_fetcher(endpoint, cache, api_key=api_key),
+        n_jobs=n_jobs,
+        retmin=retmin,
+        sleep=sleep,
+        error_sleep=error_sleep,
+    )
+    n_total = len(ids) if isinstance(ids, collections.abc.Sized) else None
+    yield from _iter_written_records(
+        fetched_batches, write_file, n_total, tqdm, extract
+    )
 
 
 def download_pubmed_ids(
-    ids: list,
+    ids: Iterable,
     write_file: IO,
     endpoint: str = "esummary",
     retmax: int = 100,
@@ -50,67 +552,194 @@ def download_pubmed_ids(
     sleep: float = 0.34,
     error_sleep: float = 10,
     tqdm=tqdm.tqdm,
+    n_jobs: int = 1,
+    cache: Optional[RecordCache] = None,
+    api_key: Optional[str] = None,
 ):
     """
     Submit an ESummary or EFetch query for PubMed records and write results as xml
     to write_file.
 
+    Requests start at most once every `sleep` seconds. Set `n_jobs` greater than 1
+    to keep several requests in flight, which lets throughput approach the rate
+    permitted by `sleep`. NCBI permits 3 requests per second without an API key
+    and 10 per second with one, so specify `api_key` to use `sleep=0.1`. Output
+    is written in the order of `ids` regardless of `n_jobs`. IDs are submitted
+    via HTTP POST, so `retmax` can be raised into the thousands to reduce the
+    number of requests.
+    `ids` can be any iterable, including the generator returned by
+    `iter_esearch_ids`, and is consumed lazily as batches are submitted.
+
+    Specify a `pubmedpy.cache.RecordCache` as `cache` to only request records
+    that are missing from the cache or stale, and to add fetched records to the
+    cache. Records are written in the order of `ids` either way.
+
     Set `tqdm=tqdm.notebook` to use the tqdm notebook interface.
     """
-    # Base URL for PubMed's esummary eutlity
-    url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/{endpoint}.fcgi"
+    # Query batches of IDs
+    batches = _iter_batches(ids, retmax)
+    fetched_batches = _iter_fetched_batches(
+        batches,
+        fetch=_get_ids_fetcher(endpoint, cache, serialize=True, api_key=api_key),
+        n_jobs=n_jobs,
+        retmin=retmin,
+        sleep=sleep,
+        error_sleep=error_sleep,
+    )
+    n_total = len(ids) if isinstance(ids, collections.abc.Sized) else None
+    _write_serialized_batches(fetched_batches, write_file, n_total, tqdm)
+
+
+def _read_download_journal(journal_path: str) -> tuple:
+    """
+    Return `(n_ids, offset, root_tag)` from the last complete entry of a journal
+    written by `download_pubmed_ids_resumable`.
+    """
+    n_ids, offset, root_tag = 0, 0, None
+    if not os.path.exists(journal_path):
+        return n_ids, offset, root_tag
+    with open(journal_path, encoding="utf-8") as read_file:
+        for line in read_file:
+            if not line.endswith("\n"):
+                # entry was interrupted while being written
+                break
+            n_ids, offset, root_tag = line.rstrip("\n").split("\t")
+    return int(n_ids), int(offset), root_tag
+
+
+def download_pubmed_ids_resumable(
+    ids: Iterable,
+    path: PathType,
+    endpoint: str = "esummary",
+    retmax: int = 100,
+    retmin: int = 20,
+    sleep: float = 0.34,
+    error_sleep: float = 10,
+    tqdm=tqdm.tqdm,
+    n_jobs: int = 1,
+    cache: Optional[RecordCache] = None,
+    api_key: Optional[str] = None,
+):
+    """
+    Like `download_pubmed_ids`, but write XML to `path` while journaling completed
+    batches to `{path}.journal`. When a previous download of the same `ids` to
+    `path` was interrupted, resume it: output written after the last journaled
+    batch is discarded, IDs already written are skipped, and new batches are
+    appended to the partial file. The journal is removed once the closing tag of
+    the XML document is written.
+    """
+    path = os.fspath(path)
+    journal_path = f"{path}.journal"
+    n_done, offset, root_tag = _read_download_journal(journal_path)
+    if n_done:
+        logging.info(f"resuming download to {path} after {n_done} IDs")
+        os.truncate(path, offset)
 
     # Set up progress stats
-    n_total = len(ids)
-    successive_errors = 0
-    progress_bar = tqdm(total=n_total, unit="articles")
-    initialize_xml = True
+    n_total = len(ids) if isinstance(ids, collections.abc.Sized) else None
+    progress_bar = tqdm(total=n_total, initial=n_done, unit="articles")
 
-    # Set up queue
-    idq = collections.deque()
-    for i in range(0, len(ids), retmax):
-        idq.append(ids[i : i + retmax])
-
-    # Query until the queue is empty
-    while idq:
-        time.sleep(sleep)
-        id_subset = idq.popleft()
-        id_subset_len = len(id_subset)
-
-        # Perform eutilities API request
-        id_string = ",".join(map(str, id_subset))
-        payload = {"db": "pubmed", "id": id_string, "rettype": "xml"}
-        try:
-            response = requests.get(url, params=payload)
-            response.raise_for_status()
-            tree = lxml.etree.fromstring(response.content)
-            successive_errors = 0
-        except Exception as e:
-            successive_errors += 1
-            logging.warning(
-                f"{successive_errors} successive error: {id_subset_len} IDs"
-                f"[{id_subset[0]} … {id_subset[-1]}] threw {e}"
-            )
-            if id_subset_len >= retmin * 2:
-                mid = len(id_subset) // 2
-                idq.appendleft(id_subset[:mid])
-                idq.appendleft(id_subset[mid:])
-            else:
-                idq.appendleft(id_subset)
-            time.sleep(error_sleep * successive_errors)
-            continue
+    # Query batches of IDs that have not been written
+    batches = _iter_batches(itertools.islice(ids, n_done, None), retmax)
+    fetched_batches = _iter_fetched_batches(
+        batches,
+        fetch=_get_ids_fetcher(endpoint, cache, serialize=True, api_key=api_key),
+        n_jobs=n_jobs,
+        retmin=retmin,
+        sleep=sleep,
+        error_sleep=error_sleep,
+    )
+    mode = "a" if n_done else "w"
+    with open(path, mode, encoding="utf-8") as write_file, open(
+        journal_path, "w", encoding="utf-8"
+    ) as journal_file:
+        if n_done:
+            # rewrite the journal without an entry interrupted while being written
+            journal_file.write(f"{n_done}\t{offset}\t{root_tag}\n")
+            journal_file.flush()
+        for id_subset, (tag, records) in fetched_batches:
+            # Write XML to file
+            if root_tag is None:
+                root_tag = tag
+                write_file.write(f"<{root_tag}>\n")
+            _write_records(records, write_file)
 
-        # Write XML to file
-        if initialize_xml:
-            initialize_xml = False
-            write_file.write(f"<{tree.tag}>\n")
-        for elem in tree.getchildren():
-            xml_str = lxml.etree.tostring(elem, encoding="unicode")
-            write_file.write(xml_str.rstrip() + "\n")
+            # Journal the batch once its XML is on disk
+            write_file.flush()
+            n_done += len(id_subset)
+            journal_file.write(f"{n_done}\t{write_file.tell()}\t{root_tag}\n")
+            journal_file.flush()
 
-        # Report progress
-        progress_bar.update(id_subset_len)
+            # Report progress
+            progress_bar.update(len(id_subset))
 
-    progress_bar.close()
-    # Write final line of XML
-    write_file.write(f"</{tree.tag}>\n")
+        progress_bar.close()
+        # Write final line of XML
+        if root_tag is not None:
+            write_file.write(f"</{root_tag}>\n")
+    os.remove(journal_path)
+
+
+def _fetch_pubmed_history(
+    endpoint: str,
+    history: dict,
+    positions: range,
+    serialize: bool = False,
+    api_key: Optional[str] = None,
+):
+    """
+    Perform an E-utilities API request for the records at positions of a result
+    stored on the history server and return the parsed XML, as returned by
+    `_parse_response`.
+    """
+    payload = {
+        "db": "pubmed",
+        "WebEnv": history["webenv"],
+        "query_key": history["query_key"],
+        "retstart": positions.start,
+        "retmax": len(positions),
+        "rettype": "xml",
+    }
+    if api_key is not None:
+        payload["api_key"] = api_key
+    response = eutilities_request(endpoint, payload, stream=True)
+    return _parse_response(response, serialize=serialize)
+
+
+def download_pubmed_history(
+    history: dict,
+    write_file: IO,
+    endpoint: str = "esummary",
+    retmax: int = 500,
+    retmin: int = 20,
+    sleep: float = 0.34,
+    error_sleep: float = 10,
+    tqdm=tqdm.tqdm,
+    n_jobs: int = 1,
+    api_key: Optional[str] = None,
+):
+    """
+    Like `download_pubmed_ids`, but download the records of an ESearch result
+    stored on the history server, as returned by `esearch_history`. Records are
+    requested by `WebEnv`, `query_key`, and `retstart`, such that the list of
+    matching identifiers is never transferred or held in memory. Note that NCBI
+    may limit how many records of a stored PubMed result can be retrieved.
+    """
+    # Query batches of positions in the stored result
+    n_total = history["count"]
+    batches = (range(i, min(i + retmax, n_total)) for i in range(0, n_total, retmax))
+    fetched_batches = _iter_fetched_batches(
+        batches,
+        fetch=functools.partial(
+            _fetch_pubmed_history,
+            endpoint,
+            history,
+            serialize=True,
+            api_key=api_key,
+        ),
+        n_jobs=n_jobs,
+        retmin=retmin,
+        sleep=sleep,
+        error_sleep=error_sleep,
+    )
+    _write_serialized_batches(fetched_batches, write_file, n_total, tqdm)
@@ -1,5 +1,8 @@
+import functools
 import string
+from typing import List, Optional
 
+import numpy
 import pandas
 
 
@@ -15,13 +18,20 @@ def simplify_fore_name(name, lower=False):
     if pandas.isna(name):
         return None
     assert isinstance(name, str)
+    return _simplify_fore_name_str(name, lower)
+
+
+def _simplify_fore_name_str(name: str, lower: bool):
+    """
+    Implement `simplify_fore_name` for a name that is a string.
+    """
     name_ = name.replace(".", " ")
     words = name_.split()
     for word in words:
         word = word.strip(string.punctuation)
         if len(word) <= 1:
             continue
-        if word.upper() == word and len(word) <= 3:
+        if len(word) <= 3 and word.upper() == word:
             continue
         if lower:
             word = word.lower()
@@ -41,3 +51,112 @@ def simplify_last_name(name, lower=False):
     if lower:
         name = name.lower()
     return name
+
+
+def _factorize_names(names: pandas.Series) -> tuple:
+    """
+    Return `(codes, uniques)` for names, where uniques is an array of the distinct
+    non-missing names and codes are positions in uniques (-1 for missing names).
+    """
+    codes, uniques = pandas.factorize(names)
+    assert all(isinstance(name, str) for name in uniques)
+    return codes, uniques
+
+
+def _take_names(names: pandas.Series, codes, simplified: list) -> pandas.Series:
+    """
+    Return a Series like names with the simplified unique name for each code,
+    or None for missing names.
+    """
+    simplified = numpy.array(simplified + [None], dtype=object)
+    # codes of -1 for missing names take the trailing None
+    values = simplified[codes]
+    return pandas.Series(values, index=names.index, name=names.name, dtype=object)
+
+
+def simplify_fore_names(names: pandas.Series, lower=False) -> pandas.Series:
+    """
+    Return a Series with the result of `simplify_fore_name` for each name. Each
+    distinct name is only simplified once, such that the cost scales with the
+    number of distinct names rather than authors.
+    """
+    codes, uniques = _factorize_names(names)
+    simplified = [_simplify_fore_name_str(name, lower) for name in uniques]
+    return _take_names(names, codes, simplified)
+
+
+def simplify_last_names(names: pandas.Series, lower=False) -> pandas.Series:
+    """
+    Return a Series with the result of `simplify_last_name` for each name. Each
+    distinct name is only simplified once, using vectorized string operations.
+    """
+    codes, uniques = _factorize_names(names)
+    simplified = pandas.Series(uniques, dtype=object)
+    simplified = simplified.str.strip(string.whitespace + string.punctuation)
+    if lower:
+        simplified = simplified.str.lower()
+    simplified = simplified.where(simplified.str.len() > 0, None)
+    return _take_names(names, codes, simplified.tolist())
+
+
+class NameSimplifier:
+    """
+    Memoized `simplify_fore_name` and `simplify_last_name`, for inputs where
+    names repeat, such as author tables. Each function has a cache of up to
+    maxsize names (unbounded when None) that evicts the least recently used
+    name. `cache_info` reports the hits and misses of each cache.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 2**18, lower: bool = False):
+        self.maxsize = maxsize
+        self.lower = lower
+        self.simplify_fore_name = functools.lru_cache(maxsize)(
+            functools.partial(simplify_fore_name, lower=lower)
+        )
+        self.simplify_last_name = functools.lru_cache(maxsize)(
+            functools.partial(simplify_last_name, lower=lower)
+        )
+
+    def __getstate__(self):
+        # caches are not picklable, so copies start with empty caches
+        return {"maxsize": self.maxsize, "lower": self.lower}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def simplify_authors(self, authors: List[dict]) -> List[dict]:
+        """
+        Add fore_name_simple and last_name_simple to author dictionaries with
+        fore_name and last_name, such as those from `efetch.extract_authors` or
+        `pmc_oai.extract_authors_from_article`. Returns authors.
+        """
+        for author in authors:
+            author["fore_name_simple"] = self.simplify_fore_name(author["fore_name"])
+            author["last_name_simple"] = self.simplify_last_name(author["last_name"])
+        return authors
+
+    def cache_info(self) -> dict:
+        """
+        Return the `functools.lru_cache` statistics of the fore_name and
+        last_name caches.
+        """
+        return {
+            "fore_name": self.simplify_fore_name.cache_info(),
+            "last_name": self.simplify_last_name.cache_info(),
+        }
+
+    def cache_clear(self) -> None:
+        self.simplify_fore_name.cache_clear()
+        self.simplify_last_name.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_name_simplifier(
+    maxsize: Optional[int] = 2**18, lower: bool = False
+) -> NameSimplifier:
+    """
+    Return the NameSimplifier shared by calls with the same arguments in this
+    process, such that its caches persist across calls, like those for
+    successive chunks in a worker process.
+    """
+    return NameSimplifier(maxsize=maxsize, lower=lower)
@@ -0,0 +1,192 @@
+"""
+Write records extracted from PubMed and PMC XML to Parquet files, such that
+later analyses read columns from disk rather than reparsing XML. Requires the
+optional pyarrow dependency, installed with `pip install pubmedpy[parquet]`.
+"""
+
+import itertools
+import os
+from typing import Iterable, List, Optional
+
+import pandas
+
+from .utils import PathType
+
+
+def _records_to_table(records: List[dict], schema=None):
+    """
+    Return a pyarrow.Table with a column for every key in records, where records
+    missing a key have a null value. Column types are inferred from the values,
+    and columns in schema are then converted to their type in schema, raising
+    pyarrow.ArrowInvalid if a value would be truncated or overflow. Nested
+    values, such as lists of authors, become list and struct columns.
+    """
+    import pyarrow
+
+    keys = dict.fromkeys(key for record in records for key in record)
+    arrays = list()
+    for key in keys:
+        array = pyarrow.array([record.get(key) for record in records])
+        if schema is not None and key in schema.names:
+            array = array.cast(schema.field(key).type, safe=True)
+        arrays.append(array)
+    return pyarrow.Table.from_arrays(arrays, names=list(keys))
+
+
+def _merge_types(type_a, type_b):
+    """
+    Return the type that values of type_a and type_b are both safely converted
+    to. Null converts to any type and integers to floating point, and list and
+    struct types merge their value and field types. Raises ValueError for other
+    differing types, which Parquet files in one directory cannot have.
+    """
+    import pyarrow
+
+    types = pyarrow.types
+    if type_a.equals(type_b) or types.is_null(type_b):
+        return type_a
+    if types.is_null(type_a):
+        return type_b
+    if types.is_integer(type_a) and types.is_floating(type_b):
+        return type_b
+    if types.is_floating(type_a) and types.is_integer(type_b):
+        return type_a
+    if types.is_list(type_a) and types.is_list(type_b):
+        return pyarrow.list_(_merge_types(type_a.value_type, type_b.value_type))
+    if types.is_struct(type_a) and types.is_struct(type_b):
+        return pyarrow.struct(_merge_fields(list(type_a), list(type_b)))
+    raise ValueError(f"cannot combine values of types {type_a} and {type_b}")
+
+
+def _merge_fields(fields_a, fields_b) -> list:
+    """
+    Return the pyarrow fields of fields_a, with types merged with the types of
+    fields with the same name in fields_b, followed by the other fields_b.
+    """
+    import pyarrow
+
+    types = {field.name: field.type for field in fields_a}
+    for field in fields_b:
+        if field.name not in types:
+            types[field.name] = field.type
+            continue
+        try:
+            types[field.name] = _merge_types(types[field.name], field.type)
+        except ValueError as error:
+            raise ValueError(f"field {field.name!r}: {error}") from None
+    return [pyarrow.field(name, type_) for name, type_ in types.items()]
+
+
+def _conform_table(table, schema):
+    """
+    Return table with the columns of schema, in order and safely converted to
+    their type in schema, where columns missing from table are null.
+    """
+    import pyarrow
+
+    arrays = [
+        (
+            table.column(field.name).cast(field.type, safe=True)
+            if field.name in table.column_names
+            else pyarrow.nulls(len(table), field.type)
+        )
+        for field in schema
+    ]
+    return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(
+    records: Iterable[dict],
+    directory: PathType,
+    row_group_size: int = 50_000,
+    rows_per_file: int = 1_000_000,
+    schema=None,
+) -> List[str]:
+    """
+    Write records, such as the output of `efetch.extract_all`,
+    `esummary.parse_esummary`, or `pmc_oai.extract_authors_from_article`, to
+    Parquet files in directory named `part-00000.parquet`, `part-00001.parquet`,
+    and so on. records can be a generator, since at most `row_group_size` records
+    are held in memory, and each file contains up to `rows_per_file` records.
+
+    Column types are inferred from the records, with columns in schema, when a
+    `pyarrow.Schema` is provided, converted to their type in schema. Row
+    groups are converted to the types of earlier row groups only when no
+    values change, such as from null or from integer to floating point. When a
+    row group has a new column or a column requires a wider type, a new file is
+    started with the types of all row groups so far. Values of conflicting
+    types, such as strings and integers in the same column, raise ValueError
+    before they are written, such that `read_parquet` can read every file.
+    Returns the paths of the written files.
+    """
+    import pyarrow.parquet
+
+    directory = os.fspath(directory)
+    os.makedirs(directory, exist_ok=True)
+    if any(name.startswith("part-") for name in os.listdir(directory)):
+        raise FileExistsError(f"{directory} already contains Parquet parts")
+    records = iter(records)
+    paths = list()
+    fields = list(schema or [])
+    writer = None
+    n_rows = 0
+    try:
+        while True:
+            batch = list(itertools.islice(records, row_group_size))
+            if not batch:
+                break
+            table = _records_to_table(batch, schema)
+            fields = _merge_fields(fields, table.schema)
+            file_schema = pyarrow.schema(fields)
+            if (
+                writer is None
+                or n_rows >= rows_per_file
+                or not file_schema.equals(writer.schema)
+            ):
+                # start a new file
+                if writer is not None:
+                    writer.close()
+                paths.append(os.path.join(directory, f"part-{len(paths):05d}.parquet"))
+                writer = pyarrow.parquet.ParquetWriter(paths[-1], file_schema)
+                n_rows = 0
+            table = _conform_table(table, writer.schema)
+            writer.write_table(table, row_group_size=row_group_size)
+            n_rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return paths
+
+
+def read_parquet(
+    directory: PathType, columns: Optional[List[str]] = None
+) -> pandas.DataFrame:
+    """
+    Read Parquet files written by `write_parquet` to a dataframe, reading only
+    `columns` when specified. Files are memory-mapped and their schemas are
+    merged as by `write_parquet`, such that a column that is null throughout one
+    file takes its type from the other files, and integer columns are read as
+    floating point when another file has floating point values.
+    """
+    import pyarrow
+    import pyarrow.dataset
+    import pyarrow.fs
+    import pyarrow.parquet
+
+    directory = os.fspath(directory)
+    paths = sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith("part-") and name.endswith(".parquet")
+    )
+    fields = list()
+    for path in paths:
+        fields = _merge_fields(
+            fields, pyarrow.parquet.read_schema(path, memory_map=True)
+        )
+    schema = pyarrow.schema(fields)
+    filesystem = pyarrow.fs.LocalFileSystem(use_mmap=True)
+    dataset = pyarrow.dataset.dataset(
+        paths, schema=schema, format="parquet", filesystem=filesystem
+    )
+    return dataset.to_table(columns=columns).to_pandas()
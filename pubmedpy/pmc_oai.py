@@ -3,9 +3,29 @@ Functions for querying the PubMed Central OAI-PMH service (PMC-OAI).
 More information is available at https://www.ncbi.nlm.nih.gov/pmc/tools/oai/
 """
 
+import concurrent.futures
+import contextlib
+import copy
+import datetime
 import functools
+import json
 import logging
+import mimetypes
+import os
+import queue
+import struct
+import sys
+import threading
 import zipfile
+from typing import Iterable, List, Optional, Tuple, Union
+
+import lxml.etree
+import pandas
+
+from .authors import AuthorTable
+from .names import get_name_simplifier
+from .utils import PathType, RateLimiter
+from .xml import _CompressedXMLWriter
 
 # URL to the OAI endpoint for PMC
 endpoint = "https://www.ncbi.nlm.nih.gov/pmc/oai/oai.cgi"
@@ -42,30 +62,650 @@ def get_sets_for_pmcid(pmcid):
     return record.header.setSpecs
 
 
-def download_frontmatter_set(oai_set, path, tqdm=None, n_records=None):
+def _get_rate_limited_sickle(rate_limiter: RateLimiter):
     """
-    Download an OAI set to a zipped file specified by path. Each file in the zip archive contains
-    frontmatter XML for a single article from the set.
+    Return a sickle OAI harvester for PMC whose requests, including those for
+    successive resumptionTokens, wait on rate_limiter.
     """
-    import lxml.etree
+    import sickle
 
-    sickler = get_sickle()
-    zip_file = zipfile.ZipFile(path, mode="w", compression=zipfile.ZIP_LZMA)
-    records = sickler.ListRecords(
-        metadataPrefix="pmc_fm", set=oai_set, ignore_deleted=True
+    sickler = sickle.Sickle(endpoint=endpoint)
+    harvest = sickler.harvest
+
+    def rate_limited_harvest(**kwargs):
+        rate_limiter.wait()
+        return harvest(**kwargs)
+
+    sickler.harvest = rate_limited_harvest
+    return sickler
+
+
+def split_date_range(start: str, end: str, n_slices: int) -> List[Tuple[str, str]]:
+    """
+    Split the inclusive date range from start to end (`YYYY-MM-DD` strings) into
+    n_slices contiguous, non-overlapping `(from, until)` ranges, suitable for
+    harvesting slices of a large OAI set concurrently.
+    """
+    start = datetime.datetime.strptime(start, "%Y-%m-%d").date()
+    end = datetime.datetime.strptime(end, "%Y-%m-%d").date()
+    n_days = (end - start).days + 1
+    n_slices = max(1, min(n_slices, n_days))
+    bounds = [
+        start + datetime.timedelta(days=n_days * i // n_slices)
+        for i in range(n_slices + 1)
+    ]
+    return [
+        (from_.isoformat(), (until - datetime.timedelta(days=1)).isoformat())
+        for from_, until in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def _get_task_key(params: dict) -> str:
+    """
+    Return the key identifying a harvesting task in a download journal.
+    """
+    return json.dumps(params, sort_keys=True)
+
+
+def _read_harvest_journal(journal_path: str) -> dict:
+    """
+    Return the harvest state from the journal of `download_frontmatter_sets`.
+    State contains the number of archive members flushed to disk as of the
+    journal as `n_written` and maps task keys to
+    `{"token": ..., "datestamp": ..., "complete": ...}` in `tasks`.
+    """
+    with open(journal_path, encoding="utf-8") as read_file:
+        return json.load(read_file)
+
+
+def _write_json(path: str, obj) -> None:
+    """
+    Atomically replace the file at path with obj encoded as JSON.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as write_file:
+        json.dump(obj, write_file, indent=1, sort_keys=True)
+        write_file.flush()
+        os.fsync(write_file.fileno())
+    os.replace(temp_path, path)
+
+
+def _get_token(records) -> Optional[str]:
+    """
+    Return the resumptionToken for the page after the current page of records.
+    """
+    resumption_token = records.resumption_token
+    return resumption_token.token if resumption_token else None
+
+
+def _harvest_frontmatter(
+    params: dict,
+    token: Optional[str],
+    rate_limiter: RateLimiter,
+    write_queue: queue.Queue,
+    stop: threading.Event,
+) -> None:
+    """
+    Harvest frontmatter for the ListRecords params, starting from the page
+    requested with token, when provided. Puts
+    `("record", task_key, page_token, datestamp, pmcid, xml_str)` tuples on
+    write_queue, where page_token requests the page containing the record and
+    datestamp is the record's OAI datestamp, followed by `("complete", task_key)`
+    once the harvest finishes. Puts None on write_queue when exiting.
+    """
+    import sickle.oaiexceptions
+
+    task_key = _get_task_key(params)
+    sickler = _get_rate_limited_sickle(rate_limiter)
+    try:
+        try:
+            if token:
+                records = sickler.ListRecords(
+                    ignore_deleted=True, resumptionToken=token
+                )
+            else:
+                records = sickler.ListRecords(ignore_deleted=True, **params)
+        except sickle.oaiexceptions.BadResumptionToken:
+            logging.warning(f"resumptionToken expired, restarting harvest of {params}")
+            token = None
+            records = sickler.ListRecords(ignore_deleted=True, **params)
+        except sickle.oaiexceptions.NoRecordsMatch:
+            logging.info(f"no records match {params}")
+            write_queue.put(("complete", task_key))
+            return
+        page_token, next_token = token, _get_token(records)
+        for record in records:
+            if stop.is_set():
+                return
+            if _get_token(records) != next_token:
+                # record is from a page requested after the previous record
+                page_token, next_token = next_token, _get_token(records)
+            article = record.xml.find("oai:metadata/{*}article", namespaces=namespaces)
+            if article is None:
+                logging.warning(f"failure to extract <article> from\n{record.raw}")
+                continue
+            pmcid = article.findtext(
+                "{*}front/{*}article-meta/{*}article-id[@pub-id-type='pmcid']"
+            )
+            xml_str = lxml.etree.tostring(article, encoding="unicode")
+            datestamp = record.header.datestamp
+            write_queue.put(("record", task_key, page_token, datestamp, pmcid, xml_str))
+        write_queue.put(("complete", task_key))
+    finally:
+        write_queue.put(None)
+
+
+def _recover_zip_members(path: str, n_members: int) -> None:
+    """
+    Rebuild the central directory of the zip archive at path from the local
+    headers of its first n_members members, such as for an archive whose
+    writing process was killed before closing it. Data following these members
+    is truncated. Raises ValueError if the archive has fewer complete members.
+    """
+    infos = list()
+    with open(path, "r+b") as archive_file:
+        size = archive_file.seek(0, os.SEEK_END)
+        offset = archive_file.seek(0)
+        while len(infos) < n_members:
+            header = archive_file.read(zipfile.sizeFileHeader)
+            if header[:4] != zipfile.stringFileHeader:
+                break
+            fields = struct.unpack(zipfile.structFileHeader, header)
+            flag_bits, compress_type, time, date, crc = fields[3:8]
+            compress_size, file_size, name_length, extra_length = fields[8:]
+            name = archive_file.read(name_length)
+            extra = archive_file.read(extra_length)
+            end = archive_file.tell() + compress_size
+            # sizes are in the local header unless written after the data
+            if flag_bits & 0x08 or end > size:
+                break
+            info = zipfile.ZipInfo(
+                name.decode("utf-8" if flag_bits & 0x800 else "cp437"),
+                date_time=(
+                    (date >> 9) + 1980,
+                    (date >> 5) & 0xF,
+                    date & 0x1F,
+                    time >> 11,
+                    (time >> 5) & 0x3F,
+                    (time & 0x1F) * 2,
+                ),
+            )
+            info.extract_version = fields[1]
+            info.flag_bits = flag_bits
+            info.compress_type = compress_type
+            info.CRC = crc
+            info.compress_size = compress_size
+            info.file_size = file_size
+            info.extra = extra
+            info.header_offset = offset
+            # permissions set by ZipFile.writestr
+            info.external_attr = 0o600 << 16
+            infos.append(info)
+            offset = archive_file.seek(end)
+        if len(infos) < n_members:
+            raise ValueError(
+                f"{path} contains {len(infos)} of the {n_members} members "
+                "recorded in its journal and cannot be resumed"
+            )
+        archive_file.truncate(offset)
+        # writing to the file object appends a central directory at offset
+        with zipfile.ZipFile(archive_file, mode="w") as zip_file:
+            for info in infos:
+                zip_file.filelist.append(info)
+                zip_file.NameToInfo[info.filename] = info
+
+
+def _check_journaled_members(path: str, n_members: int) -> None:
+    """
+    Ensure that the zip archive at path contains the n_members members recorded
+    by its journal, rebuilding the central directory if needed.
+    """
+    try:
+        with zipfile.ZipFile(path) as zip_file:
+            n_archived = len(zip_file.infolist())
+    except zipfile.BadZipFile:
+        n_archived = 0
+    if n_archived < n_members:
+        logging.warning(f"rebuilding the central directory of {path}")
+        _recover_zip_members(path, n_members)
+
+
+def _open_frontmatter_archive(
+    path: str,
+    journal_path: str,
+    resume: bool,
+    compression: int,
+    compresslevel: Optional[int],
+) -> tuple:
+    """
+    Return `(archive, state)` for writing frontmatter to path. When resuming an
+    interrupted download, the archive is opened for appending and state is read
+    from the journal. If the archive holds fewer members than the journal
+    records, as when the download was killed before closing the archive, its
+    central directory is rebuilt from the journaled members. Otherwise, a new
+    archive is created. Paths with a compression extension, such as `.xml.gz`,
+    are always created anew as a compressed XML stream.
+    """
+    _, encoding = mimetypes.guess_type(path)
+    if encoding is not None:
+        archive = _CompressedXMLWriter(path, "articles", compresslevel=compresslevel)
+        return archive, {"n_written": 0, "tasks": {}}
+    zip_kwargs = {"compression": compression}
+    if compresslevel is not None:
+        if sys.version_info < (3, 7):
+            raise ValueError("compresslevel for zip archives requires Python 3.7+")
+        zip_kwargs["compresslevel"] = compresslevel
+    if resume and os.path.exists(journal_path) and os.path.exists(path):
+        logging.info(f"resuming download to {path}")
+        state = _read_harvest_journal(journal_path)
+        _check_journaled_members(path, state["n_written"])
+        return zipfile.ZipFile(path, mode="a", **zip_kwargs), state
+    zip_file = zipfile.ZipFile(path, mode="w", **zip_kwargs)
+    return zip_file, {"n_written": 0, "tasks": {}}
+
+
+def _copy_zip_members(
+    source: zipfile.ZipFile, infos: Iterable[zipfile.ZipInfo], target: zipfile.ZipFile
+) -> None:
+    """
+    Append the members of source described by infos to target, copying their
+    compressed data rather than decompressing and recompressing it.
+    """
+    for info in infos:
+        copied = copy.copy(info)
+        if info.flag_bits & 0x08:
+            # sizes follow the data rather than the local header
+            target.writestr(copied, source.read(info))
+            continue
+        source.fp.seek(info.header_offset)
+        header = source.fp.read(zipfile.sizeFileHeader)
+        name_length, extra_length = struct.unpack(zipfile.structFileHeader, header)[10:]
+        data = source.fp.read(name_length + extra_length + info.compress_size)
+        copied.header_offset = target.fp.tell()
+        target.fp.write(header + data)
+        target.start_dir = target.fp.tell()
+        target.filelist.append(copied)
+        target.NameToInfo[copied.filename] = copied
+
+
+def _merge_frontmatter_archives(
+    archive: zipfile.ZipFile, update_path: str, path: str
+) -> None:
+    """
+    Write a zip archive to path with the members of archive, except those
+    superseded by a member with the same name in the archive at update_path or
+    by a later member of archive, followed by the members of update_path.
+    """
+    with zipfile.ZipFile(update_path) as update:
+        updated = set(update.namelist())
+        infos = {
+            info.filename: info
+            for info in archive.infolist()
+            if info.filename not in updated
+        }
+        with zipfile.ZipFile(path, mode="w") as merged:
+            _copy_zip_members(archive, infos.values(), merged)
+            _copy_zip_members(update, update.infolist(), merged)
+
+
+def _read_datestamps(datestamps_path: str) -> dict:
+    """
+    Return the mapping of OAI set to the latest datestamp harvested for the set,
+    as written by `download_frontmatter_sets`.
+    """
+    if not os.path.exists(datestamps_path):
+        return dict()
+    with open(datestamps_path, encoding="utf-8") as read_file:
+        return json.load(read_file)
+
+
+def _get_harvest_tasks(
+    oai_sets: Iterable[str],
+    date_ranges: Optional[List[Tuple[str, str]]],
+    datestamps: dict,
+    sync: bool,
+) -> List[dict]:
+    """
+    Return ListRecords params for each OAI set, or for each date range of each
+    set. When syncing, ranges start from the saved datestamp of their set, and
+    ranges ending before it are omitted.
+    """
+    tasks = list()
+    for oai_set in oai_sets:
+        for from_, until in date_ranges or [(None, None)]:
+            if sync and oai_set in datestamps:
+                # ISO 8601 dates compare correctly as strings
+                from_ = max(from_ or "", datestamps[oai_set])
+                if until and until < from_:
+                    continue
+            params = {"metadataPrefix": "pmc_fm", "set": oai_set}
+            if from_:
+                params["from"] = from_
+            if until:
+                params["until"] = until
+            tasks.append(params)
+    return tasks
+
+
+class _FrontmatterWriter:
+    """
+    Write the records that `_harvest_frontmatter` threads put on a write queue
+    to archive, journaling the harvest state to journal_path as pages are
+    written. Runs on the calling thread of `download_frontmatter_sets`.
+    """
+
+    def __init__(
+        self,
+        archive,
+        state: dict,
+        journal_path: str,
+        datestamps: dict,
+        synced: Optional[zipfile.ZipFile] = None,
+        tqdm=None,
+        n_records: Optional[int] = None,
+    ):
+        self.archive = archive
+        self.state = state
+        self.journal_path = journal_path
+        self.datestamps = datestamps
+        self.synced = synced
+        self.is_zip = isinstance(archive, zipfile.ZipFile)
+        # names of members written by this download, and of the synced archive
+        members = archive.infolist() if self.is_zip else []
+        self.written = {x.filename[:-4] for x in members}
+        state["n_written"] = len(members)
+        self.archived = set()
+        if synced is not None:
+            self.archived = {x[:-4] for x in synced.namelist()}
+        self.progress_bar = (
+            tqdm(total=n_records, initial=len(self.written), unit="articles")
+            if tqdm
+            else None
+        )
+
+    def consume(self, write_queue: queue.Queue, n_tasks: int) -> None:
+        """
+        Process items from write_queue until n_tasks harvesting threads exit.
+        """
+        n_finished = 0
+        while n_finished < n_tasks:
+            item = write_queue.get()
+            if item is None:
+                n_finished += 1
+            elif item[0] == "complete":
+                self.state["tasks"][item[1]]["complete"] = True
+                self.write_journal()
+            else:
+                self.write_record(*item[1:])
+
+    def write_journal(self) -> None:
+        """
+        Journal the harvest state once the members written so far are flushed
+        to disk, such that the journal never records members that would be
+        lost if the process were killed before closing the archive.
+        """
+        if self.is_zip:
+            self.archive.fp.flush()
+            os.fsync(self.archive.fp.fileno())
+            self.state["n_written"] = len(self.archive.infolist())
+        _write_json(self.journal_path, self.state)
+
+    def write_record(
+        self,
+        task_key: str,
+        page_token: Optional[str],
+        datestamp: str,
+        pmcid: str,
+        xml_str: str,
+    ) -> None:
+        task_state = self.state["tasks"][task_key]
+        task_state["datestamp"] = max(task_state["datestamp"] or "", datestamp)
+        if task_state["token"] != page_token:
+            task_state["token"] = page_token
+            self.write_journal()
+        if pmcid in self.written or self._is_archived(
+            task_key, datestamp, pmcid, xml_str
+        ):
+            return
+        if not self.is_zip:
+            self.archive.write(xml_str)
+        else:
+            self.archive.writestr(f"{pmcid}.xml", data=xml_str)
+        self.written.add(pmcid)
+        if self.progress_bar is not None:
+            self.progress_bar.update(1)
+
+    def _is_archived(
+        self, task_key: str, datestamp: str, pmcid: str, xml_str: str
+    ) -> bool:
+        """
+        Return whether the record is unchanged in the synced archive. OAI from
+        is inclusive, so records from the last day of the previous harvest are
+        returned again.
+        """
+        if datestamp != self.datestamps.get(json.loads(task_key)["set"]):
+            return False
+        return pmcid in self.archived and self.synced.read(
+            f"{pmcid}.xml"
+        ) == xml_str.encode("utf-8")
+
+    def close(self) -> None:
+        self.archive.close()
+        if self.progress_bar is not None:
+            self.progress_bar.close()
+
+
+def _run_harvest(
+    tasks: List[dict], writer: _FrontmatterWriter, n_jobs: int, sleep: float
+) -> None:
+    """
+    Harvest the ListRecords params of tasks on n_jobs threads, starting from
+    their journaled pages, while writer writes records on the calling thread.
+    """
+    task_states = writer.state["tasks"]
+    rate_limiter = RateLimiter(interval=sleep)
+    write_queue = queue.Queue(maxsize=1000)
+    stop = threading.Event()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [
+            executor.submit(
+                _harvest_frontmatter,
+                params,
+                task_states[_get_task_key(params)]["token"],
+                rate_limiter,
+                write_queue,
+                stop,
+            )
+            for params in tasks
+        ]
+        try:
+            writer.consume(write_queue, len(tasks))
+        finally:
+            # unblock harvesting threads before waiting on them
+            stop.set()
+            while not all(future.done() for future in futures):
+                with contextlib.suppress(queue.Empty):
+                    write_queue.get(timeout=0.1)
+            writer.close()
+    for future in futures:
+        future.result()
+
+
+def download_frontmatter_sets(
+    oai_sets: Iterable[str],
+    path: PathType,
+    date_ranges: Optional[List[Tuple[str, str]]] = None,
+    n_jobs: int = 4,
+    sleep: float = 0.34,
+    tqdm=None,
+    n_records: Optional[int] = None,
+    resume: bool = True,
+    sync: bool = False,
+    compression: int = zipfile.ZIP_LZMA,
+    compresslevel: Optional[int] = None,
+):
+    """
+    Download OAI sets to a zipped file specified by path. Each file in the zip
+    archive contains frontmatter XML for a single article. Articles in multiple
+    sets are written once.
+
+    Each set, or each slice of each set when `date_ranges` is a list of
+    `(from, until)` dates (see `split_date_range`), is harvested by one of
+    `n_jobs` threads. Requests across all threads start at most once every
+    `sleep` seconds. Records are compressed and written to the archive by the
+    calling thread, such that network requests, XML serialization, and
+    compression overlap.
+
+    Harvest progress is journaled to `{path}.journal` as the resumptionToken
+    of the page being written for each set. If the download is interrupted and
+    `resume` is True, rerunning it continues each set from its journaled page,
+    appending to the existing archive and skipping articles already written.
+    The journal is removed once all sets are harvested.
+
+    Once all sets are harvested, the latest OAI datestamp of each set is saved
+    to `{path}.datestamps.json`. When `sync` is True, only records added or
+    updated since the saved datestamp of each set are harvested, to a separate
+    archive at `{path}.sync` that is journaled and resumed like a download.
+    The existing archive is then rewritten without the earlier versions of
+    updated articles, followed by the harvested articles, copying members
+    without recompressing them. The rewritten archive replaces the existing
+    archive once complete, such that an interrupted sync leaves it intact.
+
+    Zip members are compressed with `compression` at `compresslevel`, where
+    `zipfile.ZIP_DEFLATED` is about ten times faster than the default
+    `zipfile.ZIP_LZMA`. Setting `compresslevel` for zip members requires Python
+    3.7 or later. Alternatively, when path ends with `.gz`, `.bz2`, or
+    `.xz`, articles are written as children of an `<articles>` root to a
+    compressed XML stream, which compresses better than per-article members.
+    Stream blocks are compressed concurrently on a thread pool, such that
+    harvesting is not limited by compression. Streams do not support `sync`
+    and are restarted rather than resumed.
+    """
+    path = os.fspath(path)
+    datestamps_path = f"{path}.datestamps.json"
+    if sync and mimetypes.guess_type(path)[1] is not None:
+        raise ValueError(f"sync requires a zip archive rather than {path}")
+    syncing = sync and os.path.exists(path)
+    # datestamps only apply to the archive they were saved with
+    datestamps = _read_datestamps(datestamps_path) if syncing else {}
+    harvest_path = f"{path}.sync" if syncing else path
+    journal_path = f"{harvest_path}.journal"
+    archive, state = _open_frontmatter_archive(
+        harvest_path, journal_path, resume, compression, compresslevel
     )
-    if tqdm is not None:
-        records = tqdm(records, total=n_records, desc=oai_set)
-    for record in records:
-        article = record.xml.find("oai:metadata/{*}article", namespaces=namespaces)
-        if article is None:
-            logging.warning(f"failure to extract <article> from\n{record.raw}")
-        pmcid = article.findtext(
-            "{*}front/{*}article-meta/{*}article-id[@pub-id-type='pmcid']"
+    tasks = _get_harvest_tasks(oai_sets, date_ranges, datestamps, syncing)
+    task_states = state["tasks"]
+    for params in tasks:
+        task_states.setdefault(
+            _get_task_key(params), {"token": None, "datestamp": None, "complete": False}
         )
-        xml_str = lxml.etree.tostring(article, encoding="unicode")
-        zip_file.writestr(f"{pmcid}.xml", data=xml_str)
-    zip_file.close()
+    tasks = [x for x in tasks if not task_states[_get_task_key(x)]["complete"]]
+    with contextlib.ExitStack() as stack:
+        synced = stack.enter_context(zipfile.ZipFile(path)) if syncing else None
+        writer = _FrontmatterWriter(
+            archive, state, journal_path, datestamps, synced, tqdm, n_records
+        )
+        writer.write_journal()
+        _run_harvest(tasks, writer, n_jobs, sleep)
+        if syncing:
+            _merge_frontmatter_archives(synced, harvest_path, f"{path}.tmp")
+    if syncing:
+        os.replace(f"{path}.tmp", path)
+        os.remove(harvest_path)
+
+    # save the latest datestamp of each set
+    for task_key, task_state in task_states.items():
+        oai_set = json.loads(task_key)["set"]
+        if task_state["datestamp"]:
+            datestamps[oai_set] = max(
+                datestamps.get(oai_set, ""), task_state["datestamp"]
+            )
+    _write_json(datestamps_path, datestamps)
+    os.remove(journal_path)
+
+
+def download_frontmatter_set(oai_set, path, tqdm=None, n_records=None):
+    """
+    Download an OAI set to a zipped file specified by path. Each file in the zip archive contains
+    frontmatter XML for a single article from the set. An existing archive is
+    overwritten rather than resumed. The latest OAI datestamp of the set is
+    saved to `{path}.datestamps.json`, as by `download_frontmatter_sets`.
+    """
+    download_frontmatter_sets(
+        [oai_set], path, n_jobs=1, tqdm=tqdm, n_records=n_records, resume=False
+    )
+
+
+def _standardize_pmcid(pmcid) -> str:
+    """
+    Return pmcid, which may be numeric, in the `PMC123` format of member names.
+    """
+    pmcid = str(pmcid)
+    if pmcid.upper().startswith("PMC"):
+        pmcid = pmcid[3:]
+    return f"PMC{pmcid}"
+
+
+class FrontmatterIndex:
+    """
+    Random access to articles in a frontmatter zip archive written by
+    `download_frontmatter_sets`, by PMCID. The index is built once from the
+    archive's central directory, which records the byte offset of each member,
+    such that looking up articles only reads and decompresses their members.
+    When the archive contains multiple versions of an article, the latest is
+    indexed.
+    """
+
+    def __init__(self, path: PathType):
+        self.zip_file = zipfile.ZipFile(path)
+        self.pmcid_to_info = dict()
+        for info in self.zip_file.infolist():
+            if info.filename.endswith(".xml"):
+                self.pmcid_to_info[info.filename[:-4]] = info
+
+    def __len__(self) -> int:
+        return len(self.pmcid_to_info)
+
+    def __contains__(self, pmcid) -> bool:
+        return _standardize_pmcid(pmcid) in self.pmcid_to_info
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.zip_file.close()
+
+    def get_offset(self, pmcid) -> int:
+        """
+        Return the byte offset of the archive member for pmcid.
+        """
+        return self.pmcid_to_info[_standardize_pmcid(pmcid)].header_offset
+
+    def get(self, pmcid):
+        """
+        Return the <article> element for pmcid, or None if pmcid is not archived.
+        """
+        info = self.pmcid_to_info.get(_standardize_pmcid(pmcid))
+        if info is None:
+            return None
+        return lxml.etree.fromstring(self.zip_file.read(info))
+
+    def get_many(self, pmcids: Iterable) -> Iterable[tuple]:
+        """
+        Yield `(pmcid, article)` for archived pmcids. Members are read in the
+        order they are stored in the archive, rather than the order of pmcids,
+        to read the archive sequentially. PMCIDs that are not archived are skipped.
+        """
+        infos = {
+            self.pmcid_to_info[pmcid]
+            for pmcid in map(_standardize_pmcid, pmcids)
+            if pmcid in self.pmcid_to_info
+        }
+        for info in sorted(infos, key=lambda x: x.header_offset):
+            yield info.filename[:-4], lxml.etree.fromstring(self.zip_file.read(info))
 
 
 def _contrib_elem_is_corresp(contrib_elem):
@@ -122,3 +762,134 @@ def _strip_str(value):
     if isinstance(value, str):
         value = value.strip()
     return value
+
+
+_author_columns = (
+    "pmcid",
+    "position",
+    "fore_name",
+    "last_name",
+    "corresponding",
+    "reverse_position",
+    "affiliations",
+)
+
+
+def _get_author_columns(simplify_names: bool = False) -> Tuple[str, ...]:
+    """
+    Return the columns of authors extracted from frontmatter archives.
+    """
+    if simplify_names:
+        return _author_columns + ("fore_name_simple", "last_name_simple")
+    return _author_columns
+
+
+def _get_member_chunks(
+    paths: Iterable[PathType], chunk_size: int
+) -> List[Tuple[str, List[str]]]:
+    """
+    Return `(path, names)` tuples that split the article members of each
+    frontmatter archive into chunks of chunk_size names, omitting members
+    superseded by a later member with the same name.
+    """
+    chunks = list()
+    for path in paths:
+        path = os.fspath(path)
+        with zipfile.ZipFile(path) as zip_file:
+            names = [
+                info.filename
+                for info in zip_file.infolist()
+                if info.filename.endswith(".xml")
+                and zip_file.getinfo(info.filename) is info
+            ]
+        for i in range(0, len(names), chunk_size):
+            chunks.append((path, names[i : i + chunk_size]))
+    return chunks
+
+
+@functools.lru_cache(maxsize=1)
+def _open_zip(path: str) -> zipfile.ZipFile:
+    """
+    Return the zip archive at path opened for reading, reusing the archive
+    opened by the previous call for the same path. Opening an archive parses its
+    entire central directory, which takes seconds for large archives, such that
+    each process opens an archive once rather than once per chunk of members.
+    """
+    return zipfile.ZipFile(path)
+
+
+def _extract_authors_from_members(
+    path: str, names: List[str], simplify_names: bool = False
+) -> AuthorTable:
+    """
+    Return authors extracted from the named members of a frontmatter archive.
+    """
+    table = AuthorTable(_get_author_columns(simplify_names))
+    if simplify_names:
+        simplifier = get_name_simplifier()
+    zip_file = _open_zip(path)
+    for name in names:
+        article = lxml.etree.fromstring(zip_file.read(name))
+        authors = extract_authors_from_article(article)
+        if simplify_names:
+            simplifier.simplify_authors(authors)
+        table.extend(authors)
+    return table
+
+
+def extract_authors_from_archives(
+    paths: Iterable[PathType],
+    n_jobs: Optional[int] = None,
+    chunk_size: int = 1000,
+    tqdm=None,
+    simplify_names: bool = False,
+    as_table: bool = False,
+) -> Union[pandas.DataFrame, AuthorTable]:
+    """
+    Extract authors from all articles in frontmatter zip archives written by
+    `download_frontmatter_sets` into a dataframe with one row per author and the
+    fields of `extract_authors_from_article` as columns. Members are split into
+    chunks of chunk_size articles, which are decompressed, parsed, and extracted
+    in a pool of `n_jobs` processes (defaults to the number of CPUs, or
+    extracted in this process when `n_jobs=1`). Rows are in the order of
+    articles in the archives, using the latest version of updated articles.
+    With simplify_names, add fore_name_simple and last_name_simple columns,
+    simplified by the memoized `names.get_name_simplifier()` of each process.
+    With as_table, return an `authors.AuthorTable`, which stores each distinct
+    affiliation once, rather than a dataframe.
+    """
+    chunks = _get_member_chunks(paths, chunk_size)
+    progress_bar = (
+        tqdm(total=sum(len(names) for _, names in chunks), unit="articles")
+        if tqdm
+        else None
+    )
+    table = None
+    with contextlib.ExitStack() as stack:
+        # close archives cached by this process when extracting in-process
+        stack.callback(_open_zip.cache_clear)
+        if n_jobs == 1:
+            map_ = map
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs)
+            map_ = stack.enter_context(executor).map
+        results = map_(
+            _extract_authors_from_members,
+            [path for path, _ in chunks],
+            [names for _, names in chunks],
+            [simplify_names] * len(chunks),
+        )
+        for (_, names), chunk_table in zip(chunks, results):
+            if table is None:
+                table = chunk_table
+            else:
+                table.extend_table(chunk_table)
+            if progress_bar is not None:
+                progress_bar.update(len(names))
+    if progress_bar is not None:
+        progress_bar.close()
+    if table is None:
+        table = AuthorTable(_get_author_columns(simplify_names))
+    if as_table:
+        return table
+    return table.to_dataframe()
@@ -0,0 +1,50 @@
+import os
+import pickle
+
+import pandas
+
+from ..authors import AuthorTable
+from ..efetch import extract_all, extract_authors_table
+from ..xml import iter_extract_elems
+
+directory = os.path.dirname(os.path.abspath(__file__))
+efetch_path = os.path.join(directory, "data", "efetch.xml")
+
+
+def test_author_table():
+    authors = [
+        {"pmid": "1", "fore_name": "Ann", "affiliations": ["Penn", "MIT"]},
+        {"pmid": "1", "fore_name": None, "affiliations": []},
+        {"pmid": "2", "fore_name": "Bo", "affiliations": ["MIT"]},
+    ]
+    table = AuthorTable(["pmid", "fore_name", "affiliations"])
+    table.extend(authors)
+    assert len(table) == 3
+    assert table.affiliations == ["Penn", "MIT"]
+    assert table.get_affiliation_ids(2) == [1]
+    assert table.to_records() == authors
+    assert table[-1] == authors[-1]
+    assert table.to_dataframe().equals(pandas.DataFrame(authors))
+    assert table.affiliation_pairs().values.tolist() == [[0, 0], [0, 1], [2, 1]]
+    # tables combine with affiliation ids remapped
+    other = AuthorTable(table.columns)
+    other.append({"pmid": "3", "affiliations": ["Yale", "MIT"]})
+    other = pickle.loads(pickle.dumps(other))
+    table.extend_table(other)
+    assert table.affiliations == ["Penn", "MIT", "Yale"]
+    assert table[3] == {"pmid": "3", "fore_name": None, "affiliations": ["Yale", "MIT"]}
+    assert AuthorTable(table.columns).to_dataframe().empty
+
+
+def test_extract_authors_table():
+    articles = list(map(extract_all, iter_extract_elems(efetch_path, "PubmedArticle")))
+    table = extract_authors_table(iter_extract_elems(efetch_path, "PubmedArticle"))
+    expected = [
+        {"pmid": article["pmid"], "position": i + 1, **author}
+        for article in articles
+        for i, author in enumerate(article["authors"])
+    ]
+    assert table.to_records() == expected
+    assert len(table.affiliations) < sum(
+        len(author["affiliations"]) for author in expected
+    )
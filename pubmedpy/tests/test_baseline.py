@@ -0,0 +1,77 @@
+import copy
+import gzip
+import os
+
+import pytest
+from lxml import etree
+
+from ..baseline import PubmedStore, list_pubmed_files
+from ..efetch import iter_extract_all
+from ..xml import iter_extract_elems
+
+directory = os.path.dirname(os.path.abspath(__file__))
+efetch_path = os.path.join(directory, "data", "efetch.xml")
+
+
+def write_pubmed_file(path, elems):
+    xml = b"".join(etree.tostring(elem) for elem in elems)
+    with gzip.open(path, "wb") as write_file:
+        write_file.write(b"<PubmedArticleSet>" + xml + b"</PubmedArticleSet>")
+
+
+def make_delete_citation(pmids):
+    elem = etree.Element("DeleteCitation")
+    for pmid in pmids:
+        etree.SubElement(elem, "PMID", Version="1").text = pmid
+    return elem
+
+
+def test_pubmed_store(tmp_path):
+    articles = [
+        copy.deepcopy(elem) for elem in iter_extract_elems(efetch_path, "PubmedArticle")
+    ]
+    pmids = [article.findtext("MedlineCitation/PMID") for article in articles]
+    baseline_dir = tmp_path.joinpath("baseline")
+    update_dir = tmp_path.joinpath("updatefiles")
+    baseline_dir.mkdir()
+    update_dir.mkdir()
+    write_pubmed_file(baseline_dir.joinpath("pubmed99n0001.xml.gz"), articles[:3])
+    write_pubmed_file(baseline_dir.joinpath("pubmed99n0002.xml.gz"), articles[3:])
+    # update the title of the first article and delete the second article
+    updated = copy.deepcopy(articles[0])
+    updated.find("MedlineCitation/Article/ArticleTitle").text = "Updated title"
+    write_pubmed_file(
+        update_dir.joinpath("pubmed99n0003.xml.gz"),
+        [updated, make_delete_citation(pmids[1:2])],
+    )
+    assert list(
+        map(os.path.basename, list_pubmed_files([update_dir, baseline_dir]))
+    ) == [
+        "pubmed99n0001.xml.gz",
+        "pubmed99n0002.xml.gz",
+        "pubmed99n0003.xml.gz",
+    ]
+    with PubmedStore(tmp_path.joinpath("pubmed.sqlite")) as store:
+        applied = store.ingest([baseline_dir, update_dir], n_jobs=2)
+        assert applied == store.get_ingested_files()
+        assert len(store) == len(articles) - 1
+        assert store.get(pmids[1]) is None
+        assert "Updated title" in store.get(pmids[0])
+        # a lower version does not replace a higher version
+        old_version = copy.deepcopy(articles[2])
+        old_version.find("MedlineCitation/PMID").set("Version", "0")
+        write_pubmed_file(update_dir.joinpath("pubmed99n0004.xml.gz"), [old_version])
+        assert store.ingest([baseline_dir, update_dir]) == ["pubmed99n0004.xml.gz"]
+        assert store.get(pmids[2]) == etree.tostring(
+            articles[2], encoding="unicode", with_tail=False
+        )
+        assert store.ingest([baseline_dir, update_dir]) == []
+        with pytest.raises(ValueError, match="precedes"):
+            store.ingest([tmp_path.joinpath("baseline", "pubmed99n0000.xml.gz")])
+        output_path = tmp_path.joinpath("pubmed.xml.gz")
+        store.write_xml(output_path)
+    records = list(iter_extract_all(output_path, ["pmid", "title"]))
+    assert [record["pmid"] for record in records] == sorted(
+        set(pmids) - {pmids[1]}, key=int
+    )
+    assert "Updated title" in [record["title"] for record in records]
@@ -0,0 +1,20 @@
+from ..cache import RecordCache
+
+
+def test_record_cache(tmp_path):
+    with RecordCache(tmp_path / "cache.sqlite", ttl=60) as cache:
+        cache.put_many("esummary", [("1", "<DocSum><Id>1</Id></DocSum>")])
+        cache.put_many("esummary", [(2, "<DocSum><Id>2</Id></DocSum>")], fetched_at=0)
+        cache.put_many("efetch", [("1", "<PubmedArticle/>")])
+        # record 2 is stale
+        assert cache.get_many("esummary", [1, 2, 3]) == {
+            "1": "<DocSum><Id>1</Id></DocSum>"
+        }
+        assert cache.get_many("efetch", ["1"]) == {"1": "<PubmedArticle/>"}
+        assert len(cache) == 3
+        assert cache.evict() == 1
+        assert cache.evict(max_age=None, max_records=1) == 1
+        assert len(cache) == 1
+    # records persist
+    with RecordCache(tmp_path / "cache.sqlite", ttl=None) as cache:
+        assert len(cache) == 1
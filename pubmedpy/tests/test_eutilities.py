@@ -0,0 +1,417 @@
+import functools
+import io
+import pathlib
+import threading
+
+import lxml.etree
+import pytest
+import requests
+import tqdm
+
+from ..eutilities import _iter_fetched_batches
+
+
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_iter_fetched_batches_order_with_errors(n_jobs):
+    """
+    Batches that fail are split and retried, while output retains input order.
+    """
+    ids = list(range(1000))
+    batches = [ids[i : i + 100] for i in range(0, len(ids), 100)]
+    failed = set()
+    lock = threading.Lock()
+
+    def fetch(batch):
+        # fail the first attempt of every batch containing a multiple of 300
+        with lock:
+            if any(x % 300 == 0 for x in batch) and batch[0] not in failed:
+                failed.add(batch[0])
+                raise RuntimeError("simulated error")
+        return [x * 2 for x in batch]
+
+    results = list(
+        _iter_fetched_batches(
+            batches, fetch, n_jobs=n_jobs, retmin=10, sleep=0, error_sleep=0
+        )
+    )
+    assert [x for batch, _ in results for x in batch] == ids
+    assert [x for _, result in results for x in result] == [x * 2 for x in ids]
+    assert len(results) > len(batches)
+
+
+class SimulatedCrash(BaseException):
+    pass
+
+
+def make_response(content: bytes) -> requests.Response:
+    """
+    Return a response with content, which iter_content streams in small chunks.
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    response._content_consumed = True
+    response.iter_content = functools.partial(response.iter_content, chunk_size=7)
+    return response
+
+
+# keyword arguments that disable waiting and progress bars
+quiet_kwargs = dict(
+    sleep=0, error_sleep=0, tqdm=functools.partial(tqdm.tqdm, disable=True)
+)
+
+
+class FakeEUtilities:
+    """
+    Respond to E-utilities requests without network access. ESearch serves
+    search_ids, including for searches stored on the history server. ESummary
+    returns a DocSum for each requested ID, or for each requested position of
+    search_ids, using docsums when specified. Requests are recorded as
+    (utility, payload) tuples. Requests for which fail(number, payload) is true,
+    where number counts requests from 1, raise error.
+    """
+
+    def __init__(self):
+        self.search_ids = list()
+        self.docsums = None
+        self.fail = lambda number, payload: False
+        self.error = SimulatedCrash
+        self.requests = list()
+        self.rate_limiters = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, utility, payload, stream=False, rate_limiter=None):
+        with self.lock:
+            self.requests.append((utility, dict(payload)))
+            self.rate_limiters.add(rate_limiter)
+            number = len(self.requests)
+        if self.fail(number, payload):
+            raise self.error("simulated error")
+        if utility == "esearch":
+            return self.esearch(payload)
+        return self.esummary(payload)
+
+    def esearch(self, payload):
+        count = len(self.search_ids)
+        if payload.get("usehistory") == "y":
+            return make_response(
+                f"<eSearchResult><Count>{count}</Count><RetMax>0</RetMax>"
+                "<QueryKey>1</QueryKey><WebEnv>MCID_abc</WebEnv>"
+                "</eSearchResult>".encode()
+            )
+        start = payload["retstart"]
+        ids = self.search_ids[start : start + payload["retmax"]]
+        id_list = "".join(f"<Id>{id_}</Id>" for id_ in ids)
+        return make_response(
+            f"<eSearchResult><Count>{count}</Count><IdList>{id_list}</IdList>"
+            "</eSearchResult>".encode()
+        )
+
+    def esummary(self, payload):
+        if "id" in payload:
+            ids = payload["id"].split(",")
+        else:
+            start = payload["retstart"]
+            ids = self.search_ids[start : start + payload["retmax"]]
+        if self.docsums is None:
+            docsums = "".join(
+                f'<DocSum>\n\t<Id>{id_}</Id>\n\t<Item Name="Title"/>\n</DocSum>\n'
+                for id_ in ids
+            )
+        else:
+            docsums = "".join(
+                lxml.etree.tostring(self.docsums[id_], encoding="unicode")
+                for id_ in ids
+            )
+        return make_response(f"<eSummaryResult>{docsums}</eSummaryResult>".encode())
+
+
+@pytest.fixture
+def fake_eutilities(monkeypatch):
+    from .. import eutilities
+
+    fake = FakeEUtilities()
+    monkeypatch.setattr(eutilities, "eutilities_request", fake)
+    return fake
+
+
+@pytest.mark.parametrize(
+    "journal, crashes", [("empty", {1}), ("complete", {3}), ("partial", {3, 5})]
+)
+def test_download_pubmed_ids_resumable(tmp_path, fake_eutilities, journal, crashes):
+    """
+    An interrupted download resumes from its journal and produces valid XML.
+    The journal is empty when no batch was written, and a partial journal,
+    whose last entry was cut off while being written, is rewritten on resume,
+    such that a later resume reads it.
+    """
+    from .. import eutilities
+
+    ids = [str(x) for x in range(50)]
+    fake_eutilities.fail = lambda number, payload: number in crashes
+    path = tmp_path / "esummary.xml"
+    journal_path = path.with_name("esummary.xml.journal")
+    kwargs = dict(retmax=10, **quiet_kwargs)
+    with pytest.raises(SimulatedCrash):
+        eutilities.download_pubmed_ids_resumable(ids, path, **kwargs)
+    assert journal_path.exists()
+    if journal == "partial":
+        with journal_path.open("a") as journal_file:
+            journal_file.write("50\t99")
+        with pytest.raises(SimulatedCrash):
+            eutilities.download_pubmed_ids_resumable(ids, path, **kwargs)
+        assert journal_path.read_text().count("\n") == 2
+    eutilities.download_pubmed_ids_resumable(ids, path, **kwargs)
+    assert not journal_path.exists()
+    tree = lxml.etree.parse(str(path))
+    assert [x.text for x in tree.iterfind("DocSum/Id")] == ids
+    assert len(fake_eutilities.requests) == 5 + len(crashes)
+
+
+def test_download_pubmed_ids_resumable_empty_ids(tmp_path, fake_eutilities):
+    """
+    Downloading no IDs writes an empty file.
+    """
+    from .. import eutilities
+
+    path = tmp_path / "empty.xml"
+    eutilities.download_pubmed_ids_resumable([], path, **quiet_kwargs)
+    assert path.read_text() == ""
+    assert fake_eutilities.requests == []
+
+
+def test_download_pubmed_ids_cache(tmp_path, fake_eutilities):
+    """
+    Cached records are not fetched again, and output matches an uncached download.
+    """
+    from .. import eutilities
+    from ..cache import RecordCache
+
+    def fetched():
+        ids = [
+            x
+            for _, payload in fake_eutilities.requests
+            for x in payload["id"].split(",")
+        ]
+        del fake_eutilities.requests[:]
+        return ids
+
+    kwargs = dict(retmax=4, **quiet_kwargs)
+    ids = [str(x) for x in range(10)]
+    expected = io.StringIO()
+    eutilities.download_pubmed_ids(ids, expected, **kwargs)
+    with RecordCache(tmp_path / "cache.sqlite") as cache:
+        fetched()
+        eutilities.download_pubmed_ids(ids[:6], io.StringIO(), cache=cache, **kwargs)
+        assert fetched() == ids[:6]
+        output = io.StringIO()
+        eutilities.download_pubmed_ids(ids, output, cache=cache, **kwargs)
+        assert fetched() == ids[6:]
+    assert output.getvalue() == expected.getvalue()
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_iter_pubmed_records(fake_eutilities, n_jobs):
+    """
+    Records are extracted from responses, while optionally writing the XML.
+    """
+    from .. import eutilities
+    from ..esummary import extract_articles_from_esummaries, parse_esummary
+
+    esummary_path = pathlib.Path(__file__).parent.joinpath("data", "esummary.xml")
+    tree = lxml.etree.parse(str(esummary_path)).getroot()
+    id_to_docsum = {elem.findtext("Id"): elem for elem in tree.iterfind("DocSum")}
+    fake_eutilities.docsums = id_to_docsum
+    ids = list(id_to_docsum)
+    kwargs = dict(retmax=4, n_jobs=n_jobs, **quiet_kwargs)
+    elems = list(eutilities.iter_pubmed_records(ids, **kwargs))
+    assert [elem.findtext("Id") for elem in elems] == ids
+    write_file = io.StringIO()
+    articles = list(
+        eutilities.iter_pubmed_records(
+            ids, extract=parse_esummary, write_file=write_file, **kwargs
+        )
+    )
+    expected = extract_articles_from_esummaries(esummary_path, tqdm=None)
+    assert articles == expected
+    write_file.seek(0)
+    written = lxml.etree.parse(write_file).getroot()
+    assert [elem.findtext("Id") for elem in written] == ids
+
+
+@pytest.mark.parametrize("filename", ["esummary.xml", "efetch.xml"])
+def test_parse_response(filename):
+    """
+    Serialized records from an incrementally parsed response match the output
+    of download_pubmed_ids.
+    """
+    from ..eutilities import _parse_response, _write_records
+
+    path = pathlib.Path(__file__).parent.joinpath("data", filename)
+    content = path.read_bytes()
+    root_tag, records = _parse_response(make_response(content), serialize=True)
+    assert [pmid for pmid, _ in records] == [
+        elem.findtext("Id") or elem.findtext("MedlineCitation/PMID")
+        for elem in lxml.etree.fromstring(content)
+    ]
+    write_file = io.StringIO()
+    write_file.write(f"<{root_tag}>\n")
+    _write_records(records, write_file)
+    write_file.write(f"</{root_tag}>\n")
+    assert write_file.getvalue() == content.decode()
+    tree = _parse_response(make_response(content))
+    assert len(tree) == len(records)
+
+
+def test_download_api_key(fake_eutilities):
+    """
+    The api_key is included in the payload of every fetch request.
+    """
+    from .. import eutilities
+    from ..cache import RecordCache
+
+    fake_eutilities.search_ids = ["1"]
+    kwargs = dict(retmax=2, api_key="secret", **quiet_kwargs)
+    ids = ["1", "2", "3"]
+    list(eutilities.iter_pubmed_records(ids, **kwargs))
+    with RecordCache(":memory:") as cache:
+        list(eutilities.iter_pubmed_records(ids, cache=cache, **kwargs))
+    eutilities.download_pubmed_ids(ids, io.StringIO(), **kwargs)
+    history = {"count": 1, "webenv": "abc", "query_key": "1"}
+    eutilities.download_pubmed_history(history, io.StringIO(), **kwargs)
+    payloads = [payload for _, payload in fake_eutilities.requests]
+    assert len(payloads) == 7
+    assert all(payload["api_key"] == "secret" for payload in payloads)
+
+
+def test_eutilities_request_closes_failed_response(monkeypatch):
+    """
+    A streamed response with an error status is closed before raising.
+    """
+    from .. import eutilities
+
+    response = make_response(b"Too Many Requests")
+    response.status_code = 429
+    closed = list()
+    response.close = lambda: closed.append(True)
+    monkeypatch.setattr(requests.Session, "post", lambda *args, **kwargs: response)
+    with pytest.raises(requests.HTTPError):
+        eutilities.eutilities_request("efetch", {}, stream=True)
+    assert closed == [True]
+
+
+def test_esearch_history(fake_eutilities):
+    from .. import eutilities
+
+    fake_eutilities.search_ids = list(map(str, range(25)))
+    payload = {"db": "pubmed", "term": "hetnet"}
+    history = eutilities.esearch_history(payload, sleep=0)
+    assert history == {"count": 25, "webenv": "MCID_abc", "query_key": "1"}
+    assert fake_eutilities.requests == [
+        (
+            "esearch",
+            {
+                "db": "pubmed",
+                "term": "hetnet",
+                "usehistory": "y",
+                "retmax": 0,
+                "rettype": "xml",
+            },
+        )
+    ]
+    assert payload == {"db": "pubmed", "term": "hetnet"}
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_download_pubmed_history(fake_eutilities, n_jobs):
+    """
+    Windows of the stored result are requested by retstart and retmax, failed
+    windows are split into smaller ranges, and records are written in order.
+    """
+    from .. import eutilities
+
+    fake_eutilities.search_ids = list(map(str, range(25)))
+    fake_eutilities.fail = lambda number, payload: (
+        (payload["retstart"], payload["retmax"]) == (10, 10)
+    )
+    fake_eutilities.error = requests.HTTPError
+    history = {"count": 25, "webenv": "MCID_abc", "query_key": "1"}
+    write_file = io.StringIO()
+    eutilities.download_pubmed_history(
+        history, write_file, retmax=10, retmin=5, n_jobs=n_jobs, **quiet_kwargs
+    )
+    for utility, payload in fake_eutilities.requests:
+        assert utility == "esummary"
+        assert payload["db"] == "pubmed"
+        assert payload["WebEnv"] == "MCID_abc"
+        assert payload["query_key"] == "1"
+    windows = [(p["retstart"], p["retmax"]) for _, p in fake_eutilities.requests]
+    assert sorted(windows) == [(0, 10), (10, 5), (10, 10), (15, 5), (20, 5)]
+    write_file.seek(0)
+    tree = lxml.etree.parse(write_file)
+    assert [x.text for x in tree.iterfind("DocSum/Id")] == list(map(str, range(25)))
+
+
+def test_iter_esearch_ids(fake_eutilities):
+    """
+    Pages of ESearch results are requested as the generator is consumed, such
+    that it can be passed lazily as ids to download_pubmed_ids.
+    """
+    from .. import eutilities
+
+    fake_eutilities.search_ids = list(map(str, range(7)))
+    requests_ = fake_eutilities.requests
+    payload = {"db": "pubmed", "term": "hetnet"}
+    ids = eutilities.iter_esearch_ids(payload, retmax=3, **quiet_kwargs)
+    assert requests_ == []
+    assert [next(ids) for _ in range(3)] == ["0", "1", "2"]
+    assert len(requests_) == 1
+    assert next(ids) == "3"
+    assert [p["retstart"] for _, p in requests_] == [0, 3]
+    assert list(ids) == ["4", "5", "6"]
+    assert len(requests_) == 3
+    assert eutilities.esearch_query(payload, retmax=3, **quiet_kwargs) == list(
+        map(str, range(7))
+    )
+    assert payload == {"db": "pubmed", "term": "hetnet"}
+
+    del requests_[:]
+    totals = list()
+
+    def progress_bar(**kwargs):
+        totals.append(kwargs.get("total"))
+        return tqdm.tqdm(disable=True, **kwargs)
+
+    write_file = io.StringIO()
+    eutilities.download_pubmed_ids(
+        eutilities.iter_esearch_ids(payload, retmax=3, sleep=0, tqdm=None),
+        write_file,
+        retmax=2,
+        sleep=0,
+        tqdm=progress_bar,
+    )
+    assert totals == [None]
+    # esearch pages are requested as esummary batches consume the ids
+    utilities = [utility for utility, _ in requests_]
+    assert utilities.index("esummary") < utilities.index("esearch", 1)
+    write_file.seek(0)
+    tree = lxml.etree.parse(write_file)
+    assert [x.text for x in tree.iterfind("DocSum/Id")] == list(map(str, range(7)))
+
+
+def test_iter_esearch_ids_retries_with_shared_rate_limiter(fake_eutilities):
+    """
+    Failed ESearch pages are retried, and every page waits on the rate limiter
+    that downloads with the same sleep share.
+    """
+    from .. import eutilities
+
+    fake_eutilities.search_ids = list(map(str, range(7)))
+    fake_eutilities.fail = lambda number, payload: number == 2
+    fake_eutilities.error = requests.HTTPError
+    payload = {"db": "pubmed", "term": "hetnet"}
+    ids = eutilities.iter_esearch_ids(payload, retmax=3, **quiet_kwargs)
+    assert list(ids) == list(map(str, range(7)))
+    retstarts = [p["retstart"] for _, p in fake_eutilities.requests]
+    assert retstarts == [0, 3, 3, 6]
+    assert fake_eutilities.rate_limiters == {eutilities.get_rate_limiter(0)}
@@ -1,8 +1,9 @@
+import datetime
 import os
 
 from ..eutilities import download_pubmed_ids
 import pandas
-
+import pytest
 
 directory = os.path.dirname(os.path.abspath(__file__))
 
@@ -64,3 +65,221 @@ def test_iterparse_xml():
     from ..xml import iterparse_xml
 
     ret = iterparse_xml(esummary_path)
+
+
+def test_extract_dataframe_from_esummaries():
+    from ..esummary import (
+        articles_to_dataframe,
+        extract_articles_from_esummaries,
+        extract_dataframe_from_esummaries,
+    )
+
+    articles = extract_articles_from_esummaries(esummary_path)
+    expected_df = articles_to_dataframe(articles)
+    article_df = extract_dataframe_from_esummaries(esummary_path)
+    assert article_df["pubmed_id"].dtype == "int64"
+    assert article_df["pmc_cited_by_count"].dtype == "Int64"
+    assert article_df["published"].dtype == "datetime64[ns]"
+    for column in expected_df.columns:
+        if column in {"pubmed_id", "pmc_cited_by_count"}:
+            expected_df[column] = expected_df[column].astype("Int64")
+            article_df[column] = article_df[column].astype("Int64")
+        elif article_df[column].dtype.kind == "M":
+            expected_df[column] = pandas.to_datetime(expected_df[column]).astype(
+                "datetime64[ns]"
+            )
+    pandas.testing.assert_frame_equal(article_df, expected_df)
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("2010/01/19 06:00", datetime.date(2010, 1, 19)),
+        ("2010/1/9 6:0", datetime.date(2010, 1, 9)),
+        ("2010/02/30 00:00", None),
+        ("2010/01/19 24:00", None),
+        ("2010/01/19", None),
+        ("", None),
+    ],
+)
+def test_parse_date_text(text, expected):
+    from ..esummary import parse_date_text
+
+    if expected is None:
+        with pytest.raises(ValueError):
+            parse_date_text(text)
+    else:
+        assert parse_date_text(text) == expected
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("2010 Jan 19", datetime.date(2010, 1, 19)),
+        ("2012 feb 29", datetime.date(2012, 2, 29)),
+        ("2010 Feb 29", None),
+        ("2010 Foo 01", None),
+        ("2010 Jan", None),
+        ("", None),
+    ],
+)
+def test_parse_pubdate_text(text, expected):
+    from ..esummary import parse_pubdate_text
+
+    if expected is None:
+        with pytest.raises(ValueError):
+            parse_pubdate_text(text)
+    else:
+        assert parse_pubdate_text(text) == expected
+
+
+@pytest.mark.parametrize("shard_size", [1, 5_000, 2**26])
+def test_parallel_extract_elems(shard_size):
+    from ..xml import iter_extract_elems, parallel_extract_elems
+    from ..efetch import extract_all
+
+    expected = list(map(extract_all, iter_extract_elems(efetch_path, "PubmedArticle")))
+    articles = list(
+        parallel_extract_elems(
+            efetch_path, "PubmedArticle", extract_all, n_jobs=2, shard_size=shard_size
+        )
+    )
+    assert articles == expected
+
+
+def test_extract_articles_from_esummaries_parallel():
+    from ..esummary import extract_articles_from_esummaries
+
+    expected = extract_articles_from_esummaries(esummary_path)
+    articles = extract_articles_from_esummaries(esummary_path, n_jobs=2)
+    assert articles == expected
+
+
+@pytest.mark.parametrize("extension", [".gz", ".bz2", ".xz"])
+def test_compressed_xml_writer(tmp_path, extension):
+    from lxml import etree
+
+    from ..xml import _CompressedXMLWriter, iter_extract_elems
+
+    elem_strs = [
+        etree.tostring(elem, encoding="unicode", with_tail=False)
+        for elem in iter_extract_elems(efetch_path, "PubmedArticle")
+    ]
+    path = tmp_path.joinpath(f"articles.xml{extension}")
+    writer = _CompressedXMLWriter(
+        path, "PubmedArticleSet", compresslevel=1, n_threads=2, block_size=1_000
+    )
+    for elem_str in elem_strs:
+        writer.write(elem_str)
+    writer.close()
+    assert [
+        etree.tostring(elem, encoding="unicode", with_tail=False)
+        for elem in iter_extract_elems(path, "PubmedArticle")
+    ] == elem_strs
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 2**20])
+def test_xml_pruner(chunk_size):
+    from ..xml import _XMLPruner
+
+    xml = (
+        b'<Set><A><Abstract Lang="en"><AbstractText>x</AbstractText></Abstract>'
+        b"<AbstractText>kept</AbstractText><Refs><Refs/><Refs>"
+        b"<Refs>y</Refs></Refs></Refs ><Abstract/></A></Set>"
+    )
+    pruner = _XMLPruner(["Abstract", "Refs"])
+    chunks = [xml[i : i + chunk_size] for i in range(0, len(xml), chunk_size)]
+    pruned = b"".join(map(pruner.feed, chunks)) + pruner.close()
+    assert pruned == b"<Set><A><AbstractText>kept</AbstractText></A></Set>"
+
+
+@pytest.mark.parametrize("tag", ["PubmedArticle", "Author"])
+def test_iter_parsed_elems_memory(tag):
+    from ..xml import _iter_parsed_elems
+
+    article = (
+        b"<PubmedArticle><PMID>1</PMID><AuthorList>"
+        + b"<Author><LastName>Doe</LastName></Author>" * 3
+        + b"</AuthorList><Abstract>text</Abstract></PubmedArticle>"
+    )
+    xml = b"<PubmedArticleSet>" + article * 200 + b"</PubmedArticleSet>"
+    chunks = [xml[i : i + 500] for i in range(0, len(xml), 500)]
+    n_elems = 0
+    max_size = 0
+    for elem in _iter_parsed_elems(chunks, tag):
+        root = elem.getroottree().getroot()
+        max_size = max(max_size, len(root), sum(1 for _ in root.iter()))
+        n_elems += 1
+    assert n_elems == (200 if tag == "PubmedArticle" else 600)
+    # processed articles are removed rather than retained by the root
+    assert max_size < 40
+
+
+@pytest.mark.parametrize(
+    "fields", [None, ["pmid", "doi", "publication_date"], ["authors", "title"]]
+)
+def test_iter_extract_all_fields(fields):
+    from ..efetch import extract_all, get_prune_tags, iter_extract_all
+    from ..xml import iter_extract_elems, parallel_extract_elems
+
+    expected = [
+        {
+            key: value
+            for key, value in article.items()
+            if fields is None or key in fields
+        }
+        for article in map(
+            extract_all, iter_extract_elems(efetch_path, "PubmedArticle")
+        )
+    ]
+    articles = list(iter_extract_all(efetch_path, fields))
+    assert articles == expected
+    assert all(list(article) == list(expected[0]) for article in articles)
+    if fields is not None:
+        prune_tags = get_prune_tags(fields)
+        assert ("AuthorList" in prune_tags) == ("authors" not in fields)
+    articles = list(
+        parallel_extract_elems(
+            efetch_path,
+            "PubmedArticle",
+            extract_all,
+            n_jobs=2,
+            shard_size=5_000,
+            prune_tags=get_prune_tags(),
+        )
+    )
+    assert articles == list(
+        map(extract_all, iter_extract_elems(efetch_path, "PubmedArticle"))
+    )
+
+
+def test_extract_all_unsupported_field():
+    from ..efetch import iter_extract_all
+
+    with pytest.raises(ValueError, match="abstract"):
+        next(iter_extract_all(efetch_path, ["pmid", "abstract"]))
+
+
+@pytest.mark.parametrize("layout", ["indented", "single_line"])
+@pytest.mark.parametrize("shard_size", [1, 500, 2**26])
+def test_parallel_extract_elems_layout(tmp_path, layout, shard_size):
+    """
+    Shard boundaries are found for elements that do not start a line.
+    """
+    from ..esummary import extract_articles_from_esummaries
+    from ..xml import _get_shard_offsets
+
+    with open(esummary_path, encoding="utf-8") as read_file:
+        lines = read_file.read().splitlines()
+    if layout == "indented":
+        text = "\n".join(f"  {line}" for line in lines)
+    else:
+        text = "".join(lines)
+    path = tmp_path.joinpath("esummary.xml")
+    path.write_text(text, encoding="utf-8")
+    offsets = _get_shard_offsets(str(path), "DocSum", shard_size)
+    assert text.encode()[offsets[0] :].startswith(b"<DocSum>")
+    expected = extract_articles_from_esummaries(esummary_path, tqdm=None)
+    assert len(expected) == 6
+    articles = extract_articles_from_esummaries(path, n_jobs=2, tqdm=None)
+    assert articles == expected
@@ -1,6 +1,17 @@
+import pickle
+
+import numpy
+import pandas
 import pytest
 
-from ..names import simplify_fore_name, simplify_last_name
+from ..names import (
+    NameSimplifier,
+    get_name_simplifier,
+    simplify_fore_name,
+    simplify_fore_names,
+    simplify_last_name,
+    simplify_last_names,
+)
 
 
 @pytest.mark.parametrize(
@@ -50,3 +61,54 @@ def test_simplify_fore_name_lower(fore_name, expected):
 )
 def test_simplify_last_name(last_name, expected):
     assert simplify_last_name(last_name) == expected
+
+
+@pytest.mark.parametrize("lower", [False, True])
+@pytest.mark.parametrize(
+    ("vectorized", "scalar"),
+    [
+        (simplify_fore_names, simplify_fore_name),
+        (simplify_last_names, simplify_last_name),
+    ],
+)
+def test_simplify_names_matches_scalar(vectorized, scalar, lower):
+    names = [
+        " Daniel ",
+        "A.B. Chow",
+        "LE",
+        None,
+        " Heavenstone .",
+        "",
+        " ",
+        numpy.nan,
+        "-Rafeel!",
+        " Daniel ",
+        "LE",
+    ]
+    series = pandas.Series(names, index=[3, 3, 1, 2, 2, 0, 0, 5, 4, 7, 6], name="x")
+    simplified = vectorized(series, lower=lower)
+    assert simplified.index.equals(series.index)
+    assert simplified.name == "x"
+    assert simplified.tolist() == [scalar(name, lower=lower) for name in names]
+
+
+def test_name_simplifier():
+    simplifier = NameSimplifier(maxsize=2, lower=True)
+    fore_names = [" Daniel ", "A.B. Chow", " Daniel ", None, "LE", " Daniel "]
+    assert list(map(simplifier.simplify_fore_name, fore_names)) == [
+        simplify_fore_name(name, lower=True) for name in fore_names
+    ]
+    info = simplifier.cache_info()["fore_name"]
+    # " Daniel " is evicted by None and "LE" before its last lookup
+    assert (info.hits, info.misses, info.maxsize, info.currsize) == (1, 5, 2, 2)
+    authors = simplifier.simplify_authors(
+        [{"fore_name": "A.B. Chow", "last_name": " Heavenstone ."}]
+    )
+    assert authors[0]["fore_name_simple"] == "chow"
+    assert authors[0]["last_name_simple"] == "heavenstone"
+    copy = pickle.loads(pickle.dumps(simplifier))
+    assert copy.cache_info()["fore_name"].currsize == 0
+    assert copy.simplify_last_name("Heavenstone") == "heavenstone"
+    simplifier.cache_clear()
+    assert simplifier.cache_info()["last_name"].currsize == 0
+    assert get_name_simplifier() is get_name_simplifier()
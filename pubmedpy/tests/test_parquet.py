@@ -0,0 +1,97 @@
+import itertools
+import os
+
+import pandas
+import pytest
+
+from ..efetch import extract_all
+from ..esummary import parse_esummary
+from ..pmc_oai import extract_authors_from_article
+from ..xml import iter_extract_elems
+from .test_pmc_oai import get_frontmatter_etree, pcmid_to_authors
+
+pytest.importorskip("pyarrow")
+
+from ..parquet import read_parquet, write_parquet  # noqa: E402
+
+directory = os.path.dirname(os.path.abspath(__file__))
+esummary_path = os.path.join(directory, "data", "esummary.xml")
+efetch_path = os.path.join(directory, "data", "efetch.xml")
+
+
+def test_write_parquet_efetch(tmp_path):
+    articles = list(map(extract_all, iter_extract_elems(efetch_path, "PubmedArticle")))
+    paths = write_parquet(iter(articles), tmp_path, row_group_size=2, rows_per_file=3)
+    assert len(paths) == 2
+    article_df = read_parquet(tmp_path)
+    assert len(article_df) == len(articles)
+    assert article_df.pmid.tolist() == [x["pmid"] for x in articles]
+    # authors are stored as a list column of structs
+    authors = article_df.authors.iloc[0]
+    assert [x["last_name"] for x in authors] == [
+        x["last_name"] for x in articles[0]["authors"]
+    ]
+    assert list(authors[0]["affiliations"]) == articles[0]["authors"][0]["affiliations"]
+
+
+def test_write_parquet_esummary(tmp_path):
+    """
+    DocSums have varying date keys, which are filled with nulls or start new files.
+    """
+    articles = list(map(parse_esummary, iter_extract_elems(esummary_path, "DocSum")))
+    write_parquet(articles, tmp_path, row_group_size=1)
+    article_df = read_parquet(tmp_path)
+    expected_df = pandas.DataFrame(articles)
+    assert sorted(article_df.columns) == sorted(expected_df.columns)
+    assert article_df.pubmed_id.tolist() == expected_df.pubmed_id.tolist()
+    assert article_df.entrez_0.tolist() == expected_df.entrez_0.tolist()
+    assert read_parquet(tmp_path, columns=["doi"]).columns.tolist() == ["doi"]
+
+
+def test_write_parquet_authors(tmp_path):
+    articles = map(get_frontmatter_etree, ["PMC65048", "PMC1183515", "PMC5870622"])
+    authors = itertools.chain.from_iterable(map(extract_authors_from_article, articles))
+    write_parquet(authors, tmp_path, row_group_size=4)
+    author_df = read_parquet(tmp_path)
+    assert author_df.pmcid.value_counts().to_dict() == {
+        "PMC5870622": 13,
+        "PMC65048": 2,
+        "PMC1183515": 1,
+    }
+    assert list(author_df.affiliations.iloc[-1]) == (
+        pcmid_to_authors["PMC5870622"][-1]["affiliations"]
+    )
+
+
+def test_write_parquet_existing_parts(tmp_path):
+    write_parquet([{"a": 1}], tmp_path)
+    with pytest.raises(FileExistsError):
+        write_parquet([{"a": 1}], tmp_path)
+
+
+def test_write_parquet_promotes_types(tmp_path):
+    """
+    Integers in an earlier row group are read as floats rather than truncating
+    floats in a later row group.
+    """
+    records = [{"n": 1, "x": None}, {"n": 2.5, "x": "a"}, {"n": 3, "x": None}]
+    paths = write_parquet(records, tmp_path, row_group_size=1)
+    assert len(paths) == 2
+    df = read_parquet(tmp_path)
+    assert df.n.tolist() == [1.0, 2.5, 3.0]
+    assert df.x.isna().tolist() == [True, False, True]
+
+
+def test_write_parquet_conflicting_types(tmp_path):
+    records = [{"n": 1}, {"n": "one"}]
+    with pytest.raises(ValueError, match="'n'"):
+        write_parquet(records, tmp_path, row_group_size=1)
+    # files written before the conflict remain readable
+    assert read_parquet(tmp_path).n.tolist() == [1]
+
+
+def test_write_parquet_schema_truncation(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    schema = pyarrow.schema([("n", pyarrow.int64())])
+    with pytest.raises(pyarrow.ArrowInvalid):
+        write_parquet([{"n": 1}, {"n": 2.5}], tmp_path, schema=schema)
@@ -1,11 +1,27 @@
+import json
 import pathlib
+import sys
+import types
+import zipfile
 
 from lxml import etree
 import requests
 import pytest
+from sickle import Sickle
+from sickle.response import OAIResponse
 
-from ..pmc_oai import get_sets_for_pmcid, extract_authors_from_article
-
+from .. import pmc_oai
+from ..pmc_oai import (
+    get_sets_for_pmcid,
+    extract_authors_from_article,
+    download_frontmatter_set,
+    download_frontmatter_sets,
+    split_date_range,
+    FrontmatterIndex,
+    extract_authors_from_archives,
+)
+from ..names import simplify_fore_name, simplify_last_name
+from ..xml import iterparse_xml
 
 directory = pathlib.Path(__file__).parent
 
@@ -255,3 +271,320 @@ def test_extract_authors_from_article_PMC4372613():
     article = get_frontmatter_etree_via_api(pmcid)
     authors = extract_authors_from_article(article)
     assert "California Institute of Technology" in authors[0]["affiliations"][0]
+
+
+class FakeOAIServer:
+    """
+    Respond to PMC-OAI ListRecords requests without network access, serving
+    frontmatter from the test data with one record per page.
+    """
+
+    def __init__(self, set_to_pmcids, fail_on_tokens=()):
+        self.set_to_pmcids = set_to_pmcids
+        self.fail_on_tokens = set(fail_on_tokens)
+        self.datestamps = dict()
+        self.requests = list()
+
+    def harvest(self, **params):
+        self.requests.append(params)
+        token = params.get("resumptionToken")
+        if token in self.fail_on_tokens:
+            self.fail_on_tokens.remove(token)
+            raise requests.ConnectionError(f"failed to fetch {token}")
+        if token:
+            oai_set, *from_, position = token.split(":")
+            from_ = from_[0] if from_ else ""
+        else:
+            oai_set, from_, position = params["set"], params.get("from", ""), 0
+        pmcids = [
+            x
+            for x in self.set_to_pmcids[oai_set]
+            if self.datestamps.get(x, "2019-01-01") >= from_
+        ]
+        position = int(position)
+        oai = pmc_oai.namespaces["oai"]
+        root = etree.Element(f"{{{oai}}}OAI-PMH")
+        if not pmcids:
+            error = etree.SubElement(root, f"{{{oai}}}error", code="noRecordsMatch")
+            error.text = "no records match"
+            content = etree.tostring(root)
+            http_response = types.SimpleNamespace(
+                content=content, text=content.decode()
+            )
+            return OAIResponse(http_response, params)
+        list_records = etree.SubElement(root, f"{{{oai}}}ListRecords")
+        record = etree.SubElement(list_records, f"{{{oai}}}record")
+        header = etree.SubElement(record, f"{{{oai}}}header")
+        datestamp = self.datestamps.get(pmcids[position], "2019-01-01")
+        etree.SubElement(header, f"{{{oai}}}datestamp").text = datestamp
+        metadata = etree.SubElement(record, f"{{{oai}}}metadata")
+        metadata.append(get_frontmatter_etree(pmcids[position]))
+        if position + 1 < len(pmcids):
+            resumption_token = etree.SubElement(
+                list_records, f"{{{oai}}}resumptionToken"
+            )
+            resumption_token.text = ":".join(
+                x for x in (oai_set, from_, str(position + 1)) if x
+            )
+        content = etree.tostring(root)
+        http_response = types.SimpleNamespace(content=content, text=content.decode())
+        return OAIResponse(http_response, params)
+
+
+@pytest.fixture
+def oai_server(monkeypatch):
+    server = FakeOAIServer(
+        {
+            "set_a": ["PMC65048", "PMC1183515"],
+            "set_b": ["PMC1183515", "PMC5870622", "PMC65048"],
+        }
+    )
+    monkeypatch.setattr(
+        Sickle, "harvest", lambda self, **params: server.harvest(**params)
+    )
+    return server
+
+
+def test_download_frontmatter_sets(tmp_path, oai_server):
+    path = tmp_path.joinpath("frontmatter.zip")
+    download_frontmatter_sets(["set_a", "set_b"], path, n_jobs=2, sleep=0)
+    with zipfile.ZipFile(path) as zip_file:
+        names = zip_file.namelist()
+        article = etree.fromstring(zip_file.read("PMC65048.xml"))
+    assert sorted(names) == ["PMC1183515.xml", "PMC5870622.xml", "PMC65048.xml"]
+    assert extract_authors_from_article(article) == pcmid_to_authors["PMC65048"]
+    assert len(oai_server.requests) == 5
+    assert not tmp_path.joinpath("frontmatter.zip.journal").exists()
+
+
+@pytest.mark.parametrize(
+    "filename, compression",
+    [
+        pytest.param(
+            "frontmatter.zip",
+            zipfile.ZIP_DEFLATED,
+            marks=pytest.mark.skipif(
+                sys.version_info < (3, 7), reason="zip compresslevel requires 3.7+"
+            ),
+        ),
+        ("frontmatter.xml.gz", None),
+        ("frontmatter.xml.xz", None),
+    ],
+)
+def test_download_frontmatter_sets_compression(
+    tmp_path, oai_server, filename, compression
+):
+    path = tmp_path.joinpath(filename)
+    download_frontmatter_sets(
+        ["set_a", "set_b"], path, sleep=0, compression=compression, compresslevel=1
+    )
+    if compression is None:
+        articles = list(iterparse_xml(path))[0]
+        assert [len(x.findall("{*}front")) for x in articles] == [1, 1, 1]
+    else:
+        with zipfile.ZipFile(path) as zip_file:
+            assert len(zip_file.namelist()) == 3
+            assert zip_file.infolist()[0].compress_type == compression
+
+
+def test_download_frontmatter_sets_compresslevel_python36(
+    tmp_path, oai_server, monkeypatch
+):
+    monkeypatch.setattr(sys, "version_info", (3, 6, 9))
+    path = tmp_path.joinpath("frontmatter.zip")
+    with pytest.raises(ValueError, match="requires Python 3.7"):
+        download_frontmatter_sets(["set_a"], path, sleep=0, compresslevel=1)
+
+
+def test_download_frontmatter_sets_resume(tmp_path, oai_server):
+    path = tmp_path.joinpath("frontmatter.zip")
+    oai_server.fail_on_tokens.add("set_b:2")
+    with pytest.raises(requests.ConnectionError):
+        download_frontmatter_sets(["set_a", "set_b"], path, n_jobs=1, sleep=0)
+    with zipfile.ZipFile(path) as zip_file:
+        assert len(zip_file.namelist()) == 3
+    assert tmp_path.joinpath("frontmatter.zip.journal").exists()
+    # resume skips set_a and restarts set_b from its last written page
+    del oai_server.requests[:]
+    download_frontmatter_sets(["set_a", "set_b"], path, n_jobs=1, sleep=0)
+    assert [x.get("set", x.get("resumptionToken")) for x in oai_server.requests] == [
+        "set_b:1",
+        "set_b:2",
+    ]
+    with zipfile.ZipFile(path) as zip_file:
+        names = zip_file.namelist()
+    assert sorted(names) == ["PMC1183515.xml", "PMC5870622.xml", "PMC65048.xml"]
+    assert not tmp_path.joinpath("frontmatter.zip.journal").exists()
+
+
+def test_download_frontmatter_sets_resume_killed(tmp_path, oai_server, monkeypatch):
+    """
+    Resume a download whose process was killed before closing the archive,
+    which leaves the archive without a central directory.
+    """
+    path = tmp_path.joinpath("frontmatter.zip")
+    oai_server.fail_on_tokens.add("set_b:2")
+    with monkeypatch.context() as context:
+        context.setattr(zipfile.ZipFile, "close", lambda self: None)
+        with pytest.raises(requests.ConnectionError):
+            download_frontmatter_sets(["set_a", "set_b"], path, n_jobs=1, sleep=0)
+    with pytest.raises(zipfile.BadZipFile):
+        zipfile.ZipFile(path)
+    journal = json.loads(tmp_path.joinpath("frontmatter.zip.journal").read_text())
+    assert journal["n_written"] == 2
+    # refuse to resume an archive missing journaled members
+    content = path.read_bytes()
+    path.write_bytes(content[: len(content) // 2])
+    with pytest.raises(ValueError, match="of the 2 members"):
+        download_frontmatter_sets(["set_a", "set_b"], path, n_jobs=1, sleep=0)
+    path.write_bytes(content)
+    del oai_server.requests[:]
+    download_frontmatter_sets(["set_a", "set_b"], path, n_jobs=1, sleep=0)
+    assert [x.get("set", x.get("resumptionToken")) for x in oai_server.requests] == [
+        "set_b:1",
+        "set_b:2",
+    ]
+    with zipfile.ZipFile(path) as zip_file:
+        names = zip_file.namelist()
+        assert zip_file.testzip() is None
+    assert names == ["PMC65048.xml", "PMC1183515.xml", "PMC5870622.xml"]
+    assert not tmp_path.joinpath("frontmatter.zip.journal").exists()
+
+
+def test_download_frontmatter_set_overwrites(tmp_path, oai_server):
+    path = tmp_path.joinpath("frontmatter.zip")
+    oai_server.fail_on_tokens.add("set_b:2")
+    with pytest.raises(requests.ConnectionError):
+        download_frontmatter_sets(["set_b"], path, n_jobs=1, sleep=0)
+    assert tmp_path.joinpath("frontmatter.zip.journal").exists()
+    # the stale journal is ignored rather than resumed
+    download_frontmatter_set("set_a", path)
+    with zipfile.ZipFile(path) as zip_file:
+        names = zip_file.namelist()
+    assert names == ["PMC65048.xml", "PMC1183515.xml"]
+    assert not tmp_path.joinpath("frontmatter.zip.journal").exists()
+
+
+def test_split_date_range():
+    assert split_date_range("2019-01-01", "2019-01-10", 3) == [
+        ("2019-01-01", "2019-01-03"),
+        ("2019-01-04", "2019-01-06"),
+        ("2019-01-07", "2019-01-10"),
+    ]
+    assert split_date_range("2019-01-01", "2019-01-01", 4) == [
+        ("2019-01-01", "2019-01-01")
+    ]
+
+
+def test_download_frontmatter_sets_sync(tmp_path, oai_server):
+    path = tmp_path.joinpath("frontmatter.zip")
+    download_frontmatter_sets(["set_a"], path, sleep=0)
+    datestamps_path = tmp_path.joinpath("frontmatter.zip.datestamps.json")
+    assert json.loads(datestamps_path.read_text()) == {"set_a": "2019-01-01"}
+    # an article is updated and another is added to set_a
+    oai_server.datestamps["PMC65048"] = "2019-02-01"
+    oai_server.datestamps["PMC5870622"] = "2019-02-02"
+    oai_server.set_to_pmcids["set_a"].append("PMC5870622")
+    del oai_server.requests[:]
+    # an interrupted sync leaves the archive intact and is resumed
+    oai_server.fail_on_tokens.add("set_a:2019-01-01:2")
+    with pytest.raises(requests.ConnectionError):
+        download_frontmatter_sets(["set_a"], path, sleep=0, sync=True)
+    assert oai_server.requests[0]["from"] == "2019-01-01"
+    with zipfile.ZipFile(path) as zip_file:
+        assert zip_file.namelist() == ["PMC65048.xml", "PMC1183515.xml"]
+    assert tmp_path.joinpath("frontmatter.zip.sync.journal").exists()
+    download_frontmatter_sets(["set_a"], path, sleep=0, sync=True)
+    assert json.loads(datestamps_path.read_text()) == {"set_a": "2019-02-02"}
+    # the earlier version of the updated article is replaced by the new version
+    with zipfile.ZipFile(path) as zip_file:
+        names = zip_file.namelist()
+        assert zip_file.testzip() is None
+    assert names == ["PMC1183515.xml", "PMC65048.xml", "PMC5870622.xml"]
+    assert not tmp_path.joinpath("frontmatter.zip.sync").exists()
+    assert not tmp_path.joinpath("frontmatter.zip.sync.journal").exists()
+    # syncing again with no changes keeps the archive's members
+    download_frontmatter_sets(["set_a"], path, sleep=0, sync=True)
+    with zipfile.ZipFile(path) as zip_file:
+        assert zip_file.namelist() == names
+
+
+def test_frontmatter_index(tmp_path):
+    path = tmp_path.joinpath("frontmatter.zip")
+    with zipfile.ZipFile(path, "w") as zip_file:
+        for pmcid in ["PMC65048", "PMC1183515", "PMC5870622"]:
+            zip_file.writestr(
+                f"{pmcid}.xml", etree.tostring(get_frontmatter_etree(pmcid))
+            )
+        with pytest.warns(UserWarning, match="Duplicate name"):
+            # updated version of PMC65048
+            zip_file.writestr("PMC65048.xml", "<article><front/></article>")
+    with FrontmatterIndex(path) as index:
+        assert len(index) == 3
+        assert "PMC5870622" in index and 1183515 in index and "PMC1" not in index
+        assert index.get("PMC1") is None
+        article = index.get("pmc1183515")
+        assert extract_authors_from_article(article) == pcmid_to_authors["PMC1183515"]
+        assert index.get(65048).find("front") is not None
+        pmcids = [pmcid for pmcid, _ in index.get_many(["PMC65048", "PMC1", 5870622])]
+        assert pmcids == ["PMC5870622", "PMC65048"]
+        assert index.get_offset("PMC65048") > index.get_offset("PMC5870622")
+
+
+@pytest.mark.parametrize("n_jobs, chunk_size", [(1, 1000), (2, 1), (2, 1000)])
+def test_extract_authors_from_archives(tmp_path, n_jobs, chunk_size):
+    paths = [tmp_path.joinpath("a.zip"), tmp_path.joinpath("b.zip")]
+    pmcid_lists = [["PMC65048", "PMC1183515"], ["PMC5870622"]]
+    for path, pmcids in zip(paths, pmcid_lists):
+        with zipfile.ZipFile(path, "w") as zip_file:
+            for pmcid in pmcids:
+                xml = etree.tostring(get_frontmatter_etree(pmcid))
+                zip_file.writestr(f"{pmcid}.xml", xml)
+    authors = extract_authors_from_archives(paths, n_jobs=n_jobs, chunk_size=chunk_size)
+    expected = [
+        author
+        for pmcids in pmcid_lists
+        for pmcid in pmcids
+        for author in pcmid_to_authors[pmcid]
+    ]
+    assert authors.to_dict(orient="records") == expected
+    table = extract_authors_from_archives(paths, n_jobs=1, as_table=True)
+    assert table.to_records() == expected
+    assert extract_authors_from_archives([]).empty
+
+
+def test_extract_authors_from_archives_opens_once(tmp_path, monkeypatch):
+    path = tmp_path.joinpath("a.zip")
+    pmcids = ["PMC65048", "PMC1183515", "PMC5870622"]
+    with zipfile.ZipFile(path, "w") as zip_file:
+        for pmcid in pmcids:
+            zip_file.writestr(
+                f"{pmcid}.xml", etree.tostring(get_frontmatter_etree(pmcid))
+            )
+    opened = list()
+
+    class ZipFile(zipfile.ZipFile):
+        def __init__(self, file, *args, **kwargs):
+            opened.append(file)
+            super().__init__(file, *args, **kwargs)
+
+    monkeypatch.setattr(zipfile, "ZipFile", ZipFile)
+    authors = extract_authors_from_archives([path], n_jobs=1, chunk_size=1)
+    assert authors.pmcid.unique().tolist() == pmcids
+    # opened once to list members and once to read the three chunks
+    assert len(opened) == 2
+    assert pmc_oai._open_zip.cache_info().currsize == 0
+
+
+def test_extract_authors_from_archives_simplify_names(tmp_path):
+    path = tmp_path.joinpath("a.zip")
+    with zipfile.ZipFile(path, "w") as zip_file:
+        xml = etree.tostring(get_frontmatter_etree("PMC65048"))
+        zip_file.writestr("PMC65048.xml", xml)
+    authors = extract_authors_from_archives([path], n_jobs=1, simplify_names=True)
+    assert authors.fore_name_simple.tolist() == list(
+        map(simplify_fore_name, authors.fore_name)
+    )
+    assert authors.last_name_simple.tolist() == list(
+        map(simplify_last_name, authors.last_name)
+    )
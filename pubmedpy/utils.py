@@ -1,5 +1,40 @@
 import os
+import threading
+import time
 from typing import Union
 
 # type hint for path-like objects
 PathType = Union[os.PathLike, str]
+
+
+class RateLimiter:
+    """
+    Thread-safe rate limiter that spaces successive calls to `wait` at least
+    `interval` seconds apart, regardless of how many threads share the limiter.
+    Unlike sleeping a fixed amount before each request, time spent waiting on a
+    response counts towards the interval, so that concurrent requests can reach
+    the permitted rate.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self) -> None:
+        """
+        Block until the calling thread is permitted to proceed.
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Block all callers of `wait` for at least `seconds` from now,
+        for example to back off after an error.
+        """
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
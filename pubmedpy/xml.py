@@ -1,9 +1,24 @@
+import collections
+import concurrent.futures
 import contextlib
+import functools
 import importlib
+import itertools
 import mimetypes
 import os
+import re
 import zipfile
-from typing import Iterable, Tuple
+from typing import (
+    IO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
 
 from lxml import etree
 
@@ -37,30 +52,362 @@ def iterparse_xml(path: PathType) -> Iterable[etree._Element]:
         yield from (elem for event, elem in context if event == "end")
 
 
-def iter_extract_elems(path: PathType, tag: str) -> Iterable[etree._Element]:
+def iter_extract_elems(
+    path: PathType, tag: Union[str, Tuple[str, ...]], prune_tags: Iterable[str] = ()
+) -> Iterable[etree._Element]:
     """
-    Return elements of the specified tag from XML produced by pubmedpy.eutilities.download_pubmed_ids.
-    For memory-efficiency, the XML element tree root is cleared after before yielding the next element.
+    Return elements of the specified tag, or tuple of tags, from XML produced by
+    `pubmedpy.eutilities.download_pubmed_ids`. For memory-efficiency, each
+    element is removed from the tree before yielding the next element, along
+    with the preceding siblings of its ancestors when tag is nested, like
+    `Author`. Elements with a tag in prune_tags, including their descendants,
+    are skipped without being parsed (see `_XMLPruner`).
     """
     path = os.fspath(path)
-    parser = iterparse_xml(path)
-    root = next(parser)
-    for elem in parser:
-        if elem.tag != tag:
-            continue
-        yield elem
-        root.clear()
-    root.clear()
+    _, encoding = mimetypes.guess_type(path)
+    opener = open
+    if encoding is not None:
+        opener = importlib.import_module(_encoding_to_module[encoding]).open
+    with opener(path, "rb") as read_file:
+        chunks = iter(functools.partial(read_file.read, 2**20), b"")
+        yield from _iter_parsed_elems(chunks, tag, prune_tags)
+
+
+class _XMLPruner:
+    """
+    Remove elements with the specified tags, including their descendants, from
+    XML bytes fed in chunks, such that the parser never builds them. Tags are
+    located by searching bytes rather than parsing, which assumes an
+    ASCII-compatible encoding like UTF-8 and that pruned tags do not occur in
+    comments or CDATA sections, as is the case for PubMed XML.
+    """
+
+    def __init__(self, tags: Iterable[str]):
+        tags = sorted(tags)
+        names = b"|".join(re.escape(tag.encode()) for tag in tags)
+        self.open_pattern = re.compile(rb"<(" + names + rb")(?=[\s/>])")
+        self.skip_patterns = {
+            tag.encode(): re.compile(
+                rb"<(/?)" + re.escape(tag.encode()) + rb"(?=[\s/>])"
+            )
+            for tag in tags
+        }
+        # bytes at the end of a chunk that could be the start of a pruned tag
+        self.overlap = max(map(len, tags)) + 2
+        self.buffer = b""
+        self.skip_pattern = None
+        self.depth = 0
+
+    def feed(self, data: bytes) -> bytes:
+        """
+        Return the bytes of data, preceded by bytes held from previous chunks,
+        that are outside pruned elements. Bytes that may start a pruned tag are
+        held until the next chunk.
+        """
+        buffer = self.buffer + data
+        output = list()
+        position = 0
+        while True:
+            pattern = (
+                self.open_pattern if self.skip_pattern is None else self.skip_pattern
+            )
+            match = pattern.search(buffer, position)
+            if match is None:
+                keep = max(position, len(buffer) - self.overlap)
+                if self.skip_pattern is None:
+                    output.append(buffer[position:keep])
+                position = keep
+                break
+            tag_end = buffer.find(b">", match.end())
+            if tag_end == -1:
+                # wait for the rest of the tag
+                if self.skip_pattern is None:
+                    output.append(buffer[position : match.start()])
+                position = match.start()
+                break
+            if self.skip_pattern is None:
+                output.append(buffer[position : match.start()])
+            self._visit_tag(match.group(1), buffer[tag_end - 1 : tag_end] == b"/")
+            position = tag_end + 1
+        self.buffer = buffer[position:]
+        return b"".join(output)
+
+    def _visit_tag(self, group: bytes, self_closing: bool) -> None:
+        """
+        Update the pruning state for a complete tag. Outside pruned elements,
+        group is the name of a pruned tag. Inside, group is the slash of a
+        closing tag with the name of the pruned element, or empty for an
+        opening tag with that name.
+        """
+        if self.skip_pattern is None:
+            if not self_closing:
+                self.skip_pattern = self.skip_patterns[group]
+                self.depth = 1
+            return
+        if group:
+            self.depth -= 1
+        elif not self_closing:
+            self.depth += 1
+        if self.depth == 0:
+            self.skip_pattern = None
+
+    def close(self) -> bytes:
+        """
+        Return held bytes that are outside pruned elements.
+        """
+        buffer, self.buffer = self.buffer, b""
+        return buffer if self.skip_pattern is None else b""
+
+
+def _free_processed(elem: etree._Element) -> None:
+    """
+    Free memory from a processed element, unless referenced elsewhere, by
+    removing it and the preceding siblings of it and its ancestors.
+    """
+    for node in itertools.chain([elem], elem.iterancestors()):
+        parent = node.getparent()
+        if parent is None:
+            break
+        while node.getprevious() is not None:
+            del parent[0]
+    parent = elem.getparent()
+    if parent is not None:
+        parent.remove(elem)
+
+
+def _iter_parsed_elems(
+    chunks: Iterable[bytes],
+    tag: Union[str, Tuple[str, ...]],
+    prune_tags: Iterable[str] = (),
+) -> Iterator[etree._Element]:
+    """
+    Yield elements of the specified tag from XML fed as chunks of bytes, after
+    pruning elements with a tag in prune_tags. Elements are filtered by tag in
+    the parser. Before yielding the next element, each element is removed from
+    the tree along with the preceding siblings of it and its ancestors, such
+    that the tree stays small when extracting nested tags, like `Author`.
+    """
+    parser = etree.XMLPullParser(events=("end",), tag=tag)
+    pruner = _XMLPruner(prune_tags) if prune_tags else None
+    chunks = iter(chunks)
+    while True:
+        chunk = next(chunks, None)
+        if chunk is None:
+            if pruner is not None:
+                parser.feed(pruner.close())
+            parser.close()
+        elif pruner is not None:
+            parser.feed(pruner.feed(chunk))
+        else:
+            parser.feed(chunk)
+        for _, elem in parser.read_events():
+            yield elem
+            _free_processed(elem)
+        if chunk is None:
+            break
 
 
 def yield_etrees_from_zip(path: PathType) -> Iterable[Tuple[str, etree.ElementTree]]:
     """
-    Read members of a zip file with an `.xml` extension.
+    Read members of a zip file with an `.xml` extension. When the archive
+    contains multiple members with the same name, such as updated articles
+    appended to an archive in place, only the last member with that name is
+    read.
     """
     with zipfile.ZipFile(path) as zip_file:
-        for name in zip_file.namelist():
-            if not name.endswith(".xml"):
+        for info in zip_file.infolist():
+            if not info.filename.endswith(".xml"):
                 continue
-            with zip_file.open(name) as read_file:
+            if zip_file.getinfo(info.filename) is not info:
+                # superseded by a later member with the same name
+                continue
+            with zip_file.open(info) as read_file:
                 element_tree = etree.parse(read_file)
-                yield name, element_tree
+                yield info.filename, element_tree
+
+
+class _CompressedXMLWriter:
+    """
+    Write XML elements, serialized as strings, as children of a root element to
+    a gzip, bzip2, or xz compressed file, as detected from the path extension.
+    Blocks of block_size bytes are compressed concurrently by n_threads threads
+    (the compression modules release the GIL) and written in order. Since each
+    block is an independent compressed stream, the file decompresses as one
+    document and can be read by `iterparse_xml`.
+    """
+
+    def __init__(
+        self,
+        path: PathType,
+        root_tag: str,
+        compresslevel: Optional[int] = None,
+        n_threads: Optional[int] = None,
+        block_size: int = 2**22,
+    ):
+        path = os.fspath(path)
+        _, encoding = mimetypes.guess_type(path)
+        if encoding not in _encoding_to_module:
+            raise ValueError(f"unsupported compression for {path}")
+        module = importlib.import_module(_encoding_to_module[encoding])
+        self.compress = module.compress
+        if compresslevel is not None:
+            keyword = "preset" if module.__name__ == "lzma" else "compresslevel"
+            self.compress = functools.partial(
+                module.compress, **{keyword: compresslevel}
+            )
+        self.root_tag = root_tag
+        self.block_size = block_size
+        self.n_threads = n_threads or os.cpu_count()
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.n_threads)
+        self.pending = collections.deque()
+        self.write_file = open(path, "wb")
+        self.buffer = [f'<?xml version="1.0" encoding="UTF-8"?>\n<{root_tag}>\n']
+        self.buffer_size = 0
+
+    def write(self, xml_str: str) -> None:
+        self.buffer.append(xml_str)
+        self.buffer.append("\n")
+        self.buffer_size += len(xml_str)
+        if self.buffer_size >= self.block_size:
+            self._flush_buffer()
+
+    def _flush_buffer(self) -> None:
+        data = "".join(self.buffer).encode("utf-8")
+        self.buffer = list()
+        self.buffer_size = 0
+        self.pending.append(self.executor.submit(self.compress, data))
+        # bound the number of blocks held in memory
+        while len(self.pending) > 2 * self.n_threads or (
+            self.pending and self.pending[0].done()
+        ):
+            self.write_file.write(self.pending.popleft().result())
+
+    def close(self) -> None:
+        """
+        Write the closing root tag and all pending blocks, then close the file.
+        """
+        if self.write_file.closed:
+            return
+        try:
+            self.buffer.append(f"</{self.root_tag}>\n")
+            self._flush_buffer()
+            while self.pending:
+                self.write_file.write(self.pending.popleft().result())
+        finally:
+            self.executor.shutdown()
+            self.write_file.close()
+
+
+def _find_tag_start(
+    read_file: IO, offset: int, end: int, pattern: Pattern, block_size: int = 2**20
+) -> int:
+    """
+    Return the offset of the first opening tag matched by pattern that starts
+    at or after offset, regardless of its position in a line. Return end if no
+    such tag starts before end.
+    """
+    # blocks overlap by the length of a match, such that tags spanning blocks match
+    overlap = len(pattern.pattern)
+    position = offset
+    while position < end:
+        read_file.seek(position)
+        block = read_file.read(block_size + overlap)
+        match = pattern.search(block)
+        if match is not None:
+            return min(position + match.start(), end)
+        if len(block) <= overlap:
+            break
+        position += block_size
+    return end
+
+
+def _get_shard_offsets(path: str, tag: str, shard_size: int) -> List[int]:
+    """
+    Return byte offsets that split the elements of the XML file at path into
+    shards of approximately shard_size bytes. Boundaries are placed at opening
+    tags for `tag`, such that each shard contains a sequence of complete
+    elements. Elements with this tag must not be nested in one another.
+    """
+    parser = iterparse_xml(path)
+    root_tag = next(parser).tag
+    parser.close()
+    root_close = f"</{root_tag}".encode()
+    pattern = re.compile(b"<" + re.escape(tag.encode()) + rb"[\s/>]")
+    with open(path, "rb") as read_file:
+        # Locate the closing tag of the root element
+        tail_start = max(0, read_file.seek(0, os.SEEK_END) - 2**16)
+        read_file.seek(tail_start)
+        index = read_file.read().rfind(root_close)
+        if index == -1:
+            raise ValueError(f"could not locate closing tag of <{root_tag}>")
+        end = tail_start + index
+        start = _find_tag_start(read_file, 0, end, pattern)
+        offsets = [start]
+        while offsets[-1] < end:
+            offset = offsets[-1] + shard_size
+            offsets.append(_find_tag_start(read_file, offset, end, pattern))
+    return offsets
+
+
+def _extract_shard(
+    path: str, start: int, end: int, tag: str, func: Callable, prune_tags=()
+) -> list:
+    """
+    Return func(elem) for each element with the specified tag in the byte range
+    [start, end) of the XML file at path.
+    """
+
+    def read_chunks():
+        yield b"<shard>"
+        with open(path, "rb") as read_file:
+            read_file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = read_file.read(min(2**20, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        yield b"</shard>"
+
+    return list(map(func, _iter_parsed_elems(read_chunks(), tag, prune_tags)))
+
+
+def parallel_extract_elems(
+    path: PathType,
+    tag: str,
+    func: Callable,
+    n_jobs: Optional[int] = None,
+    shard_size: int = 2**26,
+    prune_tags: Iterable[str] = (),
+) -> Iterator:
+    """
+    Yield `func(elem)` for each element of the specified tag in XML produced by
+    pubmedpy.eutilities.download_pubmed_ids, in the same order as
+    `map(func, iter_extract_elems(path, tag))`. The file is split into shards of
+    approximately shard_size bytes at opening tags for `tag`, and shards are
+    parsed in a pool of `n_jobs` processes (defaults to the number of CPUs).
+    func must be picklable, such as a module-level function like
+    `pubmedpy.efetch.extract_all`. Elements with a tag in prune_tags are skipped
+    without being parsed, as in `iter_extract_elems`. Compressed files are not
+    supported, since shards require seeking to byte offsets.
+    """
+    path = os.fspath(path)
+    _, encoding = mimetypes.guess_type(path)
+    if encoding is not None:
+        raise ValueError(f"parallel extraction requires an uncompressed file: {path}")
+    offsets = _get_shard_offsets(path, tag, shard_size)
+    starts, ends = offsets[:-1], offsets[1:]
+    n_shards = len(starts)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        shard_results = executor.map(
+            _extract_shard,
+            itertools.repeat(path, n_shards),
+            starts,
+            ends,
+            itertools.repeat(tag, n_shards),
+            itertools.repeat(func, n_shards),
+            itertools.repeat(tuple(prune_tags), n_shards),
+        )
+        for results in shard_results:
+            yield from results
@@ -19,6 +19,7 @@ long_description = readme_path.read_text(encoding="utf-8-sig")
 # dependencies including extra depedencies with an "all" option
 install_requires = [
     "lxml",
+    "numpy",
     "pandas",
     "requests",
     "sickle",
@@ -30,6 +31,9 @@ extras_require = {
         "pdoc3",
         "pytest",
     ],
+    "parquet": [
+        "pyarrow",
+    ],
 }
 extras_require["all"] = list(
     dict.fromkeys(itertools.chain.from_iterable(extras_require.values()))